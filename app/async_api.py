@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .auth import create_access_token, decode_token, normalize_email, oauth2_scheme, remember_user
+from .auth_cache import CurrentUser, token_cache
+from .db import AsyncSessionLocal
+from .metrics import sync_phase
+from .models import User
+from .passwords import password_hasher
+from .pull import parse_cursor, pull_changes
+from .schemas import RegisterRequest, SyncRequest, SyncResponse, TokenResponse
+from .sync import apply_changes
+from .wire import NegotiatedRoute, sync_response
+
+
+router = APIRouter(route_class=NegotiatedRoute)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def _get_user_by_email(db: AsyncSession, email: str) -> User | None:
+    return (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
+    user_id, expires_at = decode_token(token)
+    user = await db.get(User, user_id)
+    return remember_user(token, user.id if user else None, expires_at)
+
+
+@router.post("/auth/register", response_model=TokenResponse)
+async def register(payload: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    email = normalize_email(payload.email)
+    password = payload.password.strip()
+    if not email or "@" not in email:
+        raise HTTPException(status_code=400, detail="Invalid email")
+    if len(password) < 6:
+        raise HTTPException(status_code=400, detail="Password too short")
+    if await _get_user_by_email(db, email):
+        raise HTTPException(status_code=409, detail="Email already registered")
+    user = User(email=email, password_hash=await password_hasher.hash(password))
+    db.add(user)
+    await db.commit()
+    token = create_access_token(user.id)
+    return TokenResponse(access_token=token)
+
+
+@router.post("/auth/login", response_model=TokenResponse)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    email = normalize_email(form_data.username)
+    password = form_data.password.strip()
+    if not email or not password:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    user = await _get_user_by_email(db, email)
+    if not user or not await password_hasher.verify(password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    token = create_access_token(user.id)
+    return TokenResponse(access_token=token)
+
+
+@router.post("/sync", response_model=SyncResponse)
+async def sync(
+    request: Request,
+    payload: SyncRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", min_length=1, max_length=128),
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    after_seq = parse_cursor(payload.cursor)
+    await db.run_sync(apply_changes, user, payload.changes, payload.batch_id or idempotency_key)
+    with sync_phase("commit"):
+        await db.commit()
+
+    with sync_phase("pull"):
+        tasks, entries, next_seq, has_more = await db.run_sync(
+            pull_changes, user.id, after_seq, payload.last_sync_at, payload.limit
+        )
+    with sync_phase("serialize"):
+        return sync_response(request.headers.get("accept"), tasks, entries, next_seq, has_more)
@@ -0,0 +1,47 @@
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+
+from .auth_cache import CurrentUser, token_cache
+
+
+SECRET_KEY = os.getenv("SECRET_KEY", "change-me")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+
+
+def create_access_token(user_id: str) -> str:
+    from jose import jwt
+
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": user_id, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def normalize_email(value: str) -> str:
+    return value.strip().lower()
+
+
+def decode_token(token: str) -> tuple[str, float | None]:
+    from jose import JWTError, jwt
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+    except JWTError as exc:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED) from exc
+
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return user_id, payload.get("exp")
+
+
+def remember_user(token: str, user_id: str | None, expires_at: float | None) -> CurrentUser:
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    current = CurrentUser(id=user_id)
+    token_cache.put(token, current, expires_at)
+    return current
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from sqlalchemy import event, inspect
+
+from .metrics import AUTH_CACHE_LOOKUPS
+from .models import User
+
+
+class CurrentUser(NamedTuple):
+    id: str
+
+
+class TokenCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[CurrentUser, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, token: str) -> CurrentUser | None:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None or item[1] <= now:
+                if item is not None:
+                    del self._entries[token]
+                self.misses += 1
+                AUTH_CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            AUTH_CACHE_LOOKUPS.labels("hit").inc()
+            return item[0]
+
+    def put(self, token: str, user: CurrentUser, expires_at: float | None) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        deadline = now + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, now + expires_at - time.time())
+        if deadline <= now:
+            return
+        with self._lock:
+            self._entries[token] = (user, deadline)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            stale = [token for token, (user, _) in self._entries.items() if user.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(
+    max_size=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+
+@event.listens_for(User, "after_delete")
+def _forget_deleted_user(mapper, connection, target: User) -> None:
+    token_cache.invalidate_user(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _forget_changed_credentials(mapper, connection, target: User) -> None:
+    state = inspect(target)
+    if state.attrs.password_hash.history.has_changes() or state.attrs.email.history.has_changes():
+        token_cache.invalidate_user(target.id)
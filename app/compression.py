@@ -0,0 +1,213 @@
+import os
+import zlib
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .headers import quality_values
+
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION", "1") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Low levels: /sync bodies are repetitive enough that higher levels barely
+# shrink them further but cost noticeably more CPU per request.
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+MAX_REQUEST_BODY = int(os.getenv("MAX_REQUEST_BODY", str(32 * 1024 * 1024)))
+
+_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "text/",
+)
+# zlib window bits for each request Content-Encoding we accept.
+_REQUEST_DECODERS = {
+    "gzip": 16 + zlib.MAX_WBITS,
+    "x-gzip": 16 + zlib.MAX_WBITS,
+    "deflate": zlib.MAX_WBITS,
+}
+
+
+class _GzipEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _is_compressible(content_type: str | None) -> bool:
+    return content_type is not None and content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int, gzip_level: int, brotli_quality: int) -> None:
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.start_message: Message | None = None
+        self.encoder: _GzipEncoder | _BrotliEncoder | None = None
+        self.passthrough = False
+
+    def _new_encoder(self):
+        if self.encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        return _GzipEncoder(self.gzip_level)
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or not _is_compressible(headers.get("content-type"))
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            await self._first_body(start, message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        body = self.encoder.compress(message.get("body", b""))
+        more_body = message.get("more_body", False)
+        # Flush every chunk so streamed lines reach the client as they are
+        # produced instead of sitting in the compressor's window.
+        body += self.encoder.flush() if more_body else self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _first_body(self, start: Message, message: Message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.passthrough or (not more_body and len(body) < self.minimum_size):
+            self.passthrough = True
+            await self.send(start)
+            await self.send(message)
+            return
+
+        headers = MutableHeaders(raw=start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        self.encoder = self._new_encoder()
+        if more_body:
+            # Streaming: the length is unknown, compress chunk by chunk.
+            del headers["Content-Length"]
+            body = self.encoder.compress(body) + self.encoder.flush()
+        else:
+            body = self.encoder.compress(body) + self.encoder.finish()
+            headers["Content-Length"] = str(len(body))
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+def _decompressing_receive(receive: Receive, wbits: int, limit: int) -> Receive:
+    decoder = zlib.decompressobj(wbits)
+    size = 0
+
+    async def wrapped() -> Message:
+        nonlocal size
+        message = await receive()
+        if message["type"] != "http.request":
+            return message
+        data = message.get("body", b"")
+        chunks = []
+        try:
+            # max_length bounds the output of each step, so a small
+            # compressed body cannot inflate past the limit in memory.
+            while data:
+                chunk = decoder.decompress(data, limit - size + 1)
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail="Request body is too large")
+                chunks.append(chunk)
+                data = decoder.unconsumed_tail
+            if not message.get("more_body", False):
+                chunks.append(decoder.flush())
+        except zlib.error as exc:
+            raise HTTPException(status_code=400, detail="Malformed compressed body") from exc
+        return {"type": "http.request", "body": b"".join(chunks), "more_body": message.get("more_body", False)}
+
+    return wrapped
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip and decompress gzip/deflate requests.
+
+    Bodies under minimum_size and non-compressible types pass through.
+    Streaming responses are compressed one chunk at a time.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        max_request_body: int = MAX_REQUEST_BODY,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.max_request_body = max_request_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if request_encoding != "identity":
+            wbits = _REQUEST_DECODERS.get(request_encoding)
+            if wbits is None:
+                response = PlainTextResponse("Unsupported Content-Encoding", status_code=415)
+                await response(scope, receive, send)
+                return
+            # Updated in place: routing writes the matched route back into
+            # this same scope, and outer middleware read it from there.
+            scope["headers"] = [
+                (key, value) for key, value in scope["headers"] if key not in (b"content-encoding", b"content-length")
+            ]
+            receive = _decompressing_receive(receive, wbits, self.max_request_body)
+
+        accepted = quality_values(headers.get("accept-encoding"))
+        if accepted.get("br", 0.0) > 0:
+            encoding = "br"
+        elif accepted.get("gzip", 0.0) > 0:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(send, encoding, self.minimum_size, self.gzip_level, self.brotli_quality)
+        await self.app(scope, receive, responder)
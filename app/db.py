@@ -1,10 +1,111 @@
 import os
+import threading
+import time
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from .metrics import DB_POOL_CAPACITY, DB_POOL_CHECKED_OUT, DB_POOL_TIMEOUTS, DB_POOL_WAIT_SECONDS
 
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./timecheck.db")
+ASYNC_DB = os.getenv("DB_ASYNC") == "1"
+
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING") == "1"
+DB_POOL_LIFO = os.getenv("DB_POOL_LIFO") == "1"
+
+SQLITE_TUNED = DATABASE_URL.startswith("sqlite") and os.getenv("SQLITE_TUNED") == "1"
+if SQLITE_TUNED and ASYNC_DB:
+    # aiosqlite gives every pooled connection its own thread, so async writes
+    # would still race for the database lock; only the sync stack has the
+    # single writer.
+    raise RuntimeError("SQLITE_TUNED=1 is not supported with DB_ASYNC=1")
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}",
+    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))}",
+    f"PRAGMA cache_size={int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))}",
+)
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, waited: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckout:
+    # Pool.connect() is the public checkout entry point: engines call it for
+    # every connection they hand out, so its duration is the time a request
+    # waited for a connection.
+    metrics_label = "sync"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self._observe(time.perf_counter() - started, timed_out=True)
+            raise
+        self._observe(time.perf_counter() - started, timed_out=False)
+        return connection
+
+    def _observe(self, waited: float, timed_out: bool) -> None:
+        pool_stats.observe(waited, timed_out)
+        DB_POOL_WAIT_SECONDS.labels(self.metrics_label).observe(waited)
+        if timed_out:
+            DB_POOL_TIMEOUTS.labels(self.metrics_label).inc()
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (url.endswith("://") or ":memory:" in url)
+
+
+def _pool_options(url: str, queue_pool) -> dict:
+    if DB_POOL_MODE == "null":
+        # An external pooler (PgBouncer) owns the connections; open one per checkout.
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    if _is_memory_sqlite(url):
+        return {}
+    return {
+        "poolclass": queue_pool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_use_lifo": DB_POOL_LIFO,
+    }
 
 
 connect_args = {}
@@ -12,9 +113,89 @@ if DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **_pool_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+if SQLITE_TUNED:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+
+def _async_url(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        return f"postgresql+psycopg://{rest}"
+    return url
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        _async_url(DATABASE_URL),
+        **_pool_options(DATABASE_URL, TimedAsyncQueuePool),
+    )
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _pool_capacity(pool: QueuePool) -> int:
+    # Every QueuePool here is built by _pool_options from DB_MAX_OVERFLOW.
+    return pool.size() + max(DB_MAX_OVERFLOW, 0)
+
+
+def _export_pool_gauges(pool, label: str) -> None:
+    if not isinstance(pool, QueuePool):
+        return
+    DB_POOL_CAPACITY.labels(label).set(_pool_capacity(pool))
+    checked_out = DB_POOL_CHECKED_OUT.labels(label)
+    event.listen(pool, "checkout", lambda *args: checked_out.inc())
+    event.listen(pool, "checkin", lambda *args: checked_out.dec())
+
+
+_export_pool_gauges(engine.pool, "sync")
+if async_engine is not None:
+    _export_pool_gauges(async_engine.pool, "async")
+
+
+def _pool_status(pool) -> dict:
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__}
+    capacity = _pool_capacity(pool)
+    checked_out = pool.checkedout()
+    return {
+        "class": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+
+
+def pool_metrics() -> dict:
+    pools = {"sync": _pool_status(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = _pool_status(async_engine.pool)
+    return {
+        "pools": pools,
+        "checkouts": pool_stats.checkouts,
+        "timeouts": pool_stats.timeouts,
+        "wait_seconds_total": round(pool_stats.wait_seconds_total, 6),
+        "wait_seconds_max": round(pool_stats.wait_seconds_max, 6),
+    }
+
+
 class Base(DeclarativeBase):
     pass
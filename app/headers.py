@@ -0,0 +1,16 @@
+def quality_values(header: str | None) -> dict[str, float]:
+    # Accept / Accept-Encoding style lists: "a;q=0.5, b" -> {"a": 0.5, "b": 1.0}.
+    accepted = {}
+    for item in (header or "").split(","):
+        value, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, raw = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        if value:
+            accepted[value.lower()] = quality
+    return accepted
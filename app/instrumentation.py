@@ -0,0 +1,119 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "1") == "1"
+SLOWEST_STATEMENT_CHARS = 300
+
+logger = logging.getLogger(__name__)
+
+
+class RequestQueries:
+    __slots__ = ("count", "seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: str | None = None
+
+    def observe(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+
+# Threadpool and writer-thread jobs run in a copy of the request context; the
+# copy still points at the same RequestQueries, so their statements count too.
+current_queries: ContextVar[RequestQueries | None] = ContextVar("current_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if current_queries.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    queries = current_queries.get()
+    started = conn.info.pop("query_started", None)
+    if queries is not None and started is not None:
+        queries.observe(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _one_line(statement: str | None) -> str | None:
+    if statement is None:
+        return None
+    return " ".join(statement.split())[:SLOWEST_STATEMENT_CHARS]
+
+
+def _server_timing(queries: RequestQueries, elapsed: float) -> str:
+    return (
+        f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries", '
+        f"db-slowest;dur={queries.slowest_seconds * 1000:.2f}, "
+        f"app;dur={elapsed * 1000:.2f}"
+    )
+
+
+class InstrumentationMiddleware:
+    """Count SQL statements per request and report them.
+
+    The totals go out as a Server-Timing header, counted up to the start of
+    the response, and as fields of one log record per request, counted over
+    the whole response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        status = 500
+
+        async def timed_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", _server_timing(queries, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            current_queries.reset(token)
+            elapsed = time.perf_counter() - started
+            fields = {
+                "http_method": scope["method"],
+                "http_path": scope["path"],
+                "http_status": status,
+                "duration_ms": round(elapsed * 1000, 2),
+                "db_queries": queries.count,
+                "db_ms": round(queries.seconds * 1000, 2),
+                "db_slowest_ms": round(queries.slowest_seconds * 1000, 2),
+                "db_slowest_statement": _one_line(queries.slowest_statement),
+            }
+            logger.info(
+                " ".join(f"{key}=%s" for key in fields),
+                *fields.values(),
+                extra=fields,
+            )
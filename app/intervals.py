@@ -0,0 +1,51 @@
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import TimeEntry, User
+
+
+def _running(query, user_id: str):
+    # Matches the partial index ix_time_entries_running.
+    return query.where(
+        TimeEntry.user_id == user_id,
+        TimeEntry.stopped_at.is_(None),
+        TimeEntry.deleted_at.is_(None),
+    )
+
+
+def duration_bound(started_at: datetime, stopped_at: datetime) -> int:
+    # Whole seconds rounded up: max_entry_seconds must never be below a real
+    # duration, or overlapping_entries would miss entries straddling `start`.
+    return math.ceil((stopped_at - started_at).total_seconds())
+
+
+def running_entry_ids(db: Session, user_id: str) -> set[str]:
+    return set(db.execute(_running(select(TimeEntry.id), user_id)).scalars())
+
+
+def active_timer(db: Session, user_id: str) -> TimeEntry | None:
+    query = _running(select(TimeEntry), user_id).order_by(TimeEntry.started_at.desc()).limit(1)
+    return db.execute(query).scalar_one_or_none()
+
+
+def overlapping_entries(db: Session, user_id: str, start: datetime, stop: datetime) -> list[TimeEntry]:
+    # A finished entry overlapping [start, stop) began at most max_entry_seconds
+    # before start, which turns the overlap test into a bounded range scan on
+    # (user_id, started_at). Running entries come from the partial index.
+    max_seconds = db.execute(select(User.max_entry_seconds).where(User.id == user_id)).scalar_one()
+    finished = db.execute(
+        select(TimeEntry).where(
+            TimeEntry.user_id == user_id,
+            TimeEntry.started_at >= start - timedelta(seconds=max_seconds),
+            TimeEntry.started_at < stop,
+            TimeEntry.stopped_at > start,
+            TimeEntry.deleted_at.is_(None),
+        )
+    ).scalars().all()
+    running = db.execute(
+        _running(select(TimeEntry), user_id).where(TimeEntry.started_at < stop)
+    ).scalars().all()
+    return sorted([*finished, *running], key=lambda entry: entry.started_at)
@@ -1,22 +1,69 @@
 import os
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Literal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from .db import Base, SessionLocal, engine
-from .models import Task, TimeEntry, User
-from .schemas import RegisterRequest, SyncRequest, SyncResponse, TaskPayload, TimeEntryPayload, TokenResponse
+from .auth import create_access_token, decode_token, normalize_email, oauth2_scheme, remember_user
+from .auth_cache import CurrentUser, token_cache
+from .compression import COMPRESSION_ENABLED, CompressionMiddleware
+from .db import ASYNC_DB, SessionLocal, async_engine, engine, pool_metrics
+from .instrumentation import SQL_INSTRUMENTATION, InstrumentationMiddleware, instrument_engine
+from .intervals import active_timer, overlapping_entries
+from .metrics import METRICS_ENABLED, MetricsMiddleware, mark_process_dead, render_metrics, sync_phase
+from .migrations import ensure_schema
+from .models import User
+from .passwords import PasswordHasherBusy, password_hasher
+from .profiler import (
+    PROFILE_DEFAULT_INTERVAL_MS,
+    PROFILE_MAX_SECONDS,
+    ProfiledRoute,
+    RequestProfilerMiddleware,
+    profile_worker,
+    require_admin,
+)
+from .pull import parse_cursor, pull_changes, stream_changes
+from .rollups import read_summary
+from .schemas import (
+    DayTotal,
+    RangeBucket,
+    RangeReportResponse,
+    RegisterRequest,
+    SummaryResponse,
+    SyncChanges,
+    SyncRequest,
+    SyncResponse,
+    TimeEntryPayload,
+    TokenResponse,
+)
+from .sqlite_writer import run_write, sqlite_writer
+from .sync import RunningTimerConflict, apply_changes, sync_stats
+from .timestamps import to_naive_utc
+from .wire import NegotiatedRoute, sync_response
 
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(ensure_schema, engine)
+    yield
+    password_hasher.shutdown()
+    if sqlite_writer is not None:
+        sqlite_writer.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+    mark_process_dead(os.getpid())
 
-app = FastAPI(title="TimeCheck API")
+
+app = FastAPI(title="TimeCheck API", lifespan=lifespan)
+app.router.route_class = ProfiledRoute
 
 
 def _get_allowed_origins() -> list[str]:
@@ -43,16 +90,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+if SQL_INSTRUMENTATION:
+    instrument_engine(engine)
+    if async_engine is not None:
+        instrument_engine(async_engine.sync_engine)
+    app.add_middleware(InstrumentationMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestProfilerMiddleware)
 
-SECRET_KEY = os.getenv("SECRET_KEY", "change-me")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
-
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256", "bcrypt"],
-    deprecated="auto",
-)
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+router = APIRouter(route_class=NegotiatedRoute)
 
 
 def get_db():
@@ -63,11 +112,6 @@ def get_db():
         db.close()
 
 
-def _create_access_token(user_id: str) -> str:
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    return jwt.encode({"sub": user_id, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
-
-
 def _get_user(db: Session, user_id: str) -> User | None:
     return db.get(User, user_id)
 
@@ -75,185 +119,236 @@ def _get_user(db: Session, user_id: str) -> User | None:
 def _get_user_by_email(db: Session, email: str) -> User | None:
     return db.execute(select(User).where(User.email == email)).scalar_one_or_none()
 
-def _normalize_email(value: str) -> str:
-    return value.strip().lower()
 
+def _create_user(db: Session, email: str, password_hash: str) -> str:
+    user = User(email=email, password_hash=password_hash)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user.id
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-    except JWTError as exc:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED) from exc
 
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+def _push_changes(db: Session, user: CurrentUser, changes: SyncChanges, batch_id: str | None) -> None:
+    apply_changes(db, user, changes, batch_id)
+    with sync_phase("commit"):
+        db.commit()
 
-    user = _get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    return user
 
+def get_current_user(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> CurrentUser:
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
 
-def _normalize_dt(value: datetime) -> datetime:
-    if value.tzinfo is None:
-        return value
-    return value.astimezone(tz=None).replace(tzinfo=None)
+    user_id, expires_at = decode_token(token)
+    user = _get_user(db, user_id)
+    return remember_user(token, user.id if user else None, expires_at)
 
 
-def _should_apply(existing: datetime | None, incoming: datetime) -> bool:
-    if existing is None:
-        return True
-    return _normalize_dt(incoming) >= _normalize_dt(existing)
+@app.get("/health")
+def health():
+    return {"status": "ok"}
 
 
-def _apply_task(db: Session, user: User, payload: TaskPayload) -> None:
-    task = db.get(Task, payload.id)
-    if task is None:
-        task = Task(id=payload.id, user_id=user.id)
-        db.add(task)
-    elif task.user_id != user.id:
-        return
+@app.get("/health/db")
+def health_db():
+    return {
+        **pool_metrics(),
+        "sync": sync_stats.stats(),
+        "auth_cache": token_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
 
-    if not _should_apply(task.client_updated_at, payload.client_updated_at):
-        return
 
-    task.title = payload.title
-    task.description = payload.description
-    task.created_at = payload.created_at
-    task.updated_at = datetime.utcnow()
-    task.deleted_at = payload.deleted_at
-    task.client_updated_at = payload.client_updated_at
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404)
+    content, media_type = render_metrics()
+    return Response(content, media_type=media_type)
 
 
-def _apply_time_entry(db: Session, user: User, payload: TimeEntryPayload) -> None:
-    entry = db.get(TimeEntry, payload.id)
-    if entry is None:
-        task = db.get(Task, payload.task_id)
-        if not task or task.user_id != user.id:
-            return
-        entry = TimeEntry(id=payload.id, user_id=user.id)
-        db.add(entry)
-    elif entry.user_id != user.id:
-        return
-
-    if not _should_apply(entry.client_updated_at, payload.client_updated_at):
-        return
-
-    entry.task_id = payload.task_id
-    entry.started_at = payload.started_at
-    entry.stopped_at = payload.stopped_at
-    entry.comment = payload.comment
-    entry.created_at = payload.created_at
-    entry.updated_at = datetime.utcnow()
-    entry.deleted_at = payload.deleted_at
-    entry.client_updated_at = payload.client_updated_at
-
-
-def _collapse_changes(changes):
-    latest = {}
-    for change in changes:
-        record_id = change.data.id
-        existing = latest.get(record_id)
-        if not existing or change.data.client_updated_at >= existing.data.client_updated_at:
-            latest[record_id] = change
-    return list(latest.values())
+@app.get("/admin/profile", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def admin_profile(
+    seconds: float = Query(default=10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(default=PROFILE_DEFAULT_INTERVAL_MS, ge=1, le=1000),
+):
+    return await profile_worker(seconds, interval_ms)
+
+
+@app.exception_handler(RunningTimerConflict)
+async def running_timer_conflict(request: Request, exc: RunningTimerConflict):
+    return JSONResponse(
+        status_code=409,
+        content={
+            "detail": "Another timer is already running",
+            "entry_id": exc.entry_id,
+            "running_entry_id": exc.running_id,
+        },
+    )
 
 
-@app.get("/health")
-def health():
-    return {"status": "ok"}
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many authentication requests"},
+        headers={"Retry-After": "1"},
+    )
 
 
-@app.post("/auth/register", response_model=TokenResponse)
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
-    email = _normalize_email(payload.email)
+@router.post("/auth/register", response_model=TokenResponse)
+async def register(payload: RegisterRequest, db: Session = Depends(get_db)):
+    email = normalize_email(payload.email)
     password = payload.password.strip()
     if not email or "@" not in email:
         raise HTTPException(status_code=400, detail="Invalid email")
     if len(password) < 6:
         raise HTTPException(status_code=400, detail="Password too short")
-    if _get_user_by_email(db, email):
+    if await run_in_threadpool(_get_user_by_email, db, email):
         raise HTTPException(status_code=409, detail="Email already registered")
-    user = User(
-        email=email,
-        password_hash=pwd_context.hash(password),
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    token = _create_access_token(user.id)
+    password_hash = await password_hasher.hash(password)
+    user_id = await run_in_threadpool(run_write, db, _create_user, email, password_hash)
+    token = create_access_token(user_id)
     return TokenResponse(access_token=token)
 
 
-@app.post("/auth/login", response_model=TokenResponse)
-def login(
+@router.post("/auth/login", response_model=TokenResponse)
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
 ):
-    email = _normalize_email(form_data.username)
+    email = normalize_email(form_data.username)
     password = form_data.password.strip()
     if not email or not password:
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    user = _get_user_by_email(db, email)
-    if not user or not pwd_context.verify(password, user.password_hash):
+    user = await run_in_threadpool(_get_user_by_email, db, email)
+    if not user or not await password_hasher.verify(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = _create_access_token(user.id)
+    token = create_access_token(user.id)
     return TokenResponse(access_token=token)
 
 
-@app.post("/sync", response_model=SyncResponse)
+@router.post("/sync", response_model=SyncResponse)
 def sync(
+    request: Request,
     payload: SyncRequest,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", min_length=1, max_length=128),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    for change in _collapse_changes(payload.changes.tasks):
-        _apply_task(db, user, change.data)
+    after_seq = parse_cursor(payload.cursor)
+    run_write(db, _push_changes, user, payload.changes, payload.batch_id or idempotency_key)
 
-    for change in _collapse_changes(payload.changes.time_entries):
-        _apply_time_entry(db, user, change.data)
+    with sync_phase("pull"):
+        tasks, entries, next_seq, has_more = pull_changes(
+            db, user.id, after_seq, payload.last_sync_at, payload.limit
+        )
+    with sync_phase("serialize"):
+        return sync_response(request.headers.get("accept"), tasks, entries, next_seq, has_more)
+
+
+@app.get("/sync/stream")
+def sync_stream(
+    cursor: str | None = None,
+    user: CurrentUser = Depends(get_current_user),
+):
+    after_seq = parse_cursor(cursor)
+    return StreamingResponse(
+        stream_changes(user.id, after_seq),
+        media_type="application/x-ndjson",
+    )
 
-    db.commit()
 
-    last_sync = payload.last_sync_at
-    task_query = select(Task).where(Task.user_id == user.id)
-    entry_query = select(TimeEntry).where(TimeEntry.user_id == user.id)
-    if last_sync is not None:
-        task_query = task_query.where(Task.updated_at >= last_sync)
-        entry_query = entry_query.where(TimeEntry.updated_at >= last_sync)
-
-    tasks = db.execute(task_query).scalars().all()
-    entries = db.execute(entry_query).scalars().all()
-
-    return SyncResponse(
-        server_time=datetime.utcnow(),
-        tasks=[
-            TaskPayload(
-                id=task.id,
-                title=task.title,
-                description=task.description,
-                created_at=task.created_at,
-                updated_at=task.updated_at,
-                deleted_at=task.deleted_at,
-                client_updated_at=task.client_updated_at,
-            )
-            for task in tasks
-        ],
-        time_entries=[
-            TimeEntryPayload(
-                id=entry.id,
-                task_id=entry.task_id,
-                started_at=entry.started_at,
-                stopped_at=entry.stopped_at,
-                comment=entry.comment,
-                created_at=entry.created_at,
-                updated_at=entry.updated_at,
-                deleted_at=entry.deleted_at,
-                client_updated_at=entry.client_updated_at,
-            )
-            for entry in entries
-        ],
+@app.get("/reports/summary", response_model=SummaryResponse)
+def reports_summary(
+    date_from: date = Query(alias="from"),
+    date_to: date = Query(alias="to"),
+    task_id: str | None = None,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    totals = read_summary(db, user.id, date_from, date_to, task_id)
+    return SummaryResponse(
+        date_from=date_from,
+        date_to=date_to,
+        total_seconds=sum(total.seconds for total in totals),
+        days=[DayTotal(day=total.day, task_id=total.task_id, seconds=total.seconds) for total in totals],
     )
+
+
+@app.get("/entries", response_model=list[TimeEntryPayload])
+def entries_in_range(
+    start: datetime = Query(alias="from"),
+    stop: datetime = Query(alias="to"),
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    start, stop = to_naive_utc(start), to_naive_utc(stop)
+    if stop <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    return [
+        TimeEntryPayload.model_validate(entry, from_attributes=True)
+        for entry in overlapping_entries(db, user.id, start, stop)
+    ]
+
+
+@app.get("/timer/active", response_model=TimeEntryPayload | None)
+def timer_active(
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    entry = active_timer(db, user.id)
+    if entry is None:
+        return None
+    return TimeEntryPayload.model_validate(entry, from_attributes=True)
+
+
+MAX_REPORT_RANGE = timedelta(days=3660)
+
+
+@app.get("/reports/range", response_model=RangeReportResponse)
+def reports_range(
+    start: datetime = Query(alias="from"),
+    stop: datetime = Query(alias="to"),
+    group_by: Literal["task", "day", "week", "month"] = "day",
+    tz: str = "UTC",
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    from .reports import range_report
+
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Unknown time zone") from exc
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=zone)
+    if stop.tzinfo is None:
+        stop = stop.replace(tzinfo=zone)
+    if stop <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if stop - start > MAX_REPORT_RANGE:
+        raise HTTPException(status_code=400, detail="Range is too long")
+
+    buckets = range_report(db, user.id, start, stop, group_by, zone)
+    return RangeReportResponse(
+        group_by=group_by,
+        tz=tz,
+        start=start,
+        stop=stop,
+        total_seconds=sum(seconds for _, _, seconds in buckets),
+        buckets=[RangeBucket(key=key, start=bucket_start, seconds=seconds) for key, bucket_start, seconds in buckets],
+    )
+
+
+if ASYNC_DB:
+    from .async_api import router as async_router
+
+    app.include_router(async_router)
+else:
+    app.include_router(router)
+
@@ -0,0 +1,179 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import generate_latest, multiprocess
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+# With several uvicorn/gunicorn workers, point PROMETHEUS_MULTIPROC_DIR at an
+# empty directory shared by them; every worker writes its samples there and
+# /metrics aggregates all of them.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Every metric has labels: prometheus_client only allocates per-process
+# storage on first use of a label set, so processes that never record a
+# metric (password-hash workers, for instance) leave no files behind.
+SYNC_PHASE_SECONDS = Histogram(
+    "timecheck_sync_phase_seconds",
+    "Time spent in each phase of /sync.",
+    ["phase"],
+    buckets=_LATENCY_BUCKETS,
+)
+SYNC_CHANGES = Counter(
+    "timecheck_sync_changes_total",
+    "Changes received by /sync, by record type and outcome.",
+    ["kind", "outcome"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "timecheck_http_request_seconds",
+    "Request latency per route.",
+    ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS = Counter(
+    "timecheck_http_requests_total",
+    "Requests per route and status code.",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_BYTES = Histogram(
+    "timecheck_http_request_bytes",
+    "Request body size on the wire per route.",
+    ["route"],
+    buckets=_SIZE_BUCKETS,
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "timecheck_http_response_bytes",
+    "Response body size on the wire per route.",
+    ["route"],
+    buckets=_SIZE_BUCKETS,
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "timecheck_password_hash_seconds",
+    "Time spent in pwd_context hashing or verifying, excluding queueing.",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+PASSWORD_QUEUE_SECONDS = Histogram(
+    "timecheck_password_queue_seconds",
+    "Time a password hash job waited for a worker.",
+    ["operation"],
+    buckets=_LATENCY_BUCKETS,
+)
+PASSWORD_REJECTED = Counter(
+    "timecheck_password_rejected_total",
+    "Password hash jobs rejected because the queue was full.",
+    ["operation"],
+)
+AUTH_CACHE_LOOKUPS = Counter(
+    "timecheck_auth_cache_lookups_total",
+    "Token cache lookups in get_current_user, by result.",
+    ["result"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "timecheck_db_pool_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    ["pool"],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "timecheck_db_pool_timeouts_total",
+    "Connection checkouts that gave up after DB_POOL_TIMEOUT.",
+    ["pool"],
+)
+# Saturation is checked_out / capacity; livesum adds up the live workers.
+DB_POOL_CHECKED_OUT = Gauge(
+    "timecheck_db_pool_checked_out",
+    "Connections currently checked out of the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "timecheck_db_pool_capacity",
+    "pool_size + max_overflow of the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+_PHASES = ("collapse", "prefetch", "apply_tasks", "apply_entries", "commit", "pull", "serialize")
+
+
+@lru_cache(maxsize=len(_PHASES))
+def _phase(name: str):
+    # Created on first use rather than at import: password-hash workers import
+    # this module too and must not allocate samples.
+    return SYNC_PHASE_SECONDS.labels(name)
+
+
+@contextmanager
+def sync_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phase(name).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+def _route_label(scope: Scope) -> str:
+    # The route template, not the raw path, keeps label cardinality bounded.
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request_bytes = 0
+        response_bytes = 0
+        status = 500
+
+        async def counting_receive() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message) -> None:
+            nonlocal response_bytes, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = _route_label(scope)
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status)).inc()
+            HTTP_REQUEST_BYTES.labels(route).observe(request_bytes)
+            HTTP_RESPONSE_BYTES.labels(route).observe(response_bytes)
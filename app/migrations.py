@@ -0,0 +1,155 @@
+import logging
+import os
+from collections import defaultdict
+
+from sqlalchemy import Column, Integer, Table, bindparam, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from .db import Base, engine
+from .intervals import duration_bound
+from .models import SyncBatch, Task, TimeEntry, User
+from .rollups import rebuild_task_day_totals
+
+
+logger = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+# Arbitrary constant shared by every process that runs upgrade().
+_MIGRATION_LOCK_KEY = 7_230_511
+
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+)
+
+
+def _create_index(conn: Connection, table: Table, name: str) -> None:
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(conn, checkfirst=True)
+
+
+def _add_column(conn: Connection, table: Table, ddl: str) -> None:
+    name = ddl.split()[0]
+    if name in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+        return
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+
+def _add_sync_indexes(conn: Connection) -> None:
+    _create_index(conn, Task.__table__, "ix_tasks_user_id_updated_at")
+    _create_index(conn, TimeEntry.__table__, "ix_time_entries_user_id_updated_at")
+    _create_index(conn, TimeEntry.__table__, "ix_time_entries_task_id")
+
+
+def _backfill_change_seq(conn: Connection, user_id: str) -> None:
+    seq = 0
+    for table in (Task.__table__, TimeEntry.__table__):
+        ids = conn.execute(
+            select(table.c.id)
+            .where(table.c.user_id == user_id, table.c.change_seq == 0)
+            .order_by(table.c.updated_at, table.c.id)
+        ).scalars().all()
+        if not ids:
+            continue
+        conn.execute(
+            update(table).where(table.c.id == bindparam("row_id")).values(change_seq=bindparam("seq")),
+            [{"row_id": row_id, "seq": seq + offset} for offset, row_id in enumerate(ids, start=1)],
+        )
+        seq += len(ids)
+    users = User.__table__
+    conn.execute(update(users).where(users.c.id == user_id).values(change_seq=users.c.change_seq + seq))
+
+
+def _add_change_seq(conn: Connection) -> None:
+    for table in (Task.__table__, TimeEntry.__table__, User.__table__):
+        _add_column(conn, table, "change_seq BIGINT NOT NULL DEFAULT 0")
+    for user_id in conn.execute(select(User.__table__.c.id)).scalars().all():
+        _backfill_change_seq(conn, user_id)
+    _create_index(conn, Task.__table__, "ix_tasks_user_id_change_seq")
+    _create_index(conn, TimeEntry.__table__, "ix_time_entries_user_id_change_seq")
+
+
+def _backfill_max_entry_seconds(conn: Connection) -> None:
+    entries = TimeEntry.__table__
+    longest: dict[str, int] = defaultdict(int)
+    query = select(entries.c.user_id, entries.c.started_at, entries.c.stopped_at).where(
+        entries.c.stopped_at.is_not(None)
+    )
+    for user_id, started_at, stopped_at in conn.execute(query.execution_options(yield_per=1000)):
+        longest[user_id] = max(longest[user_id], duration_bound(started_at, stopped_at))
+    users = User.__table__
+    for user_id, seconds in longest.items():
+        conn.execute(update(users).where(users.c.id == user_id).values(max_entry_seconds=seconds))
+
+
+def _add_interval_indexes(conn: Connection) -> None:
+    _add_column(conn, User.__table__, "max_entry_seconds BIGINT NOT NULL DEFAULT 0")
+    _backfill_max_entry_seconds(conn)
+    entries = TimeEntry.__table__
+    _create_index(conn, entries, "ix_time_entries_user_id_started_at")
+    _create_index(conn, entries, "ix_time_entries_running")
+
+
+def _add_sync_batches(conn: Connection) -> None:
+    SyncBatch.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, _add_sync_indexes),
+    (2, _add_change_seq),
+    (3, rebuild_task_day_totals),
+    (4, _add_interval_indexes),
+    (5, _add_sync_batches),
+    # Version 4 rounded durations down, which let /entries miss entries
+    # straddling `from`.
+    (6, _backfill_max_entry_seconds),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _lock_schema(conn: Connection) -> None:
+    # Every worker of `uvicorn --workers N` may start upgrading at once; the
+    # lock makes the others wait, and they then find the schema up to date.
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+    elif dialect == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def upgrade(bind: Engine = engine) -> int:
+    with bind.begin() as conn:
+        _lock_schema(conn)
+        Base.metadata.create_all(bind=conn)
+        version = current_version(conn)
+        for target, migration in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info("Applying migration %s (%s)", target, migration.__name__)
+            migration(conn)
+            conn.execute(insert(schema_version).values(version=target))
+            version = target
+    return version
+
+
+def ensure_schema(bind: Engine = engine, auto_migrate: bool = AUTO_MIGRATE) -> int:
+    with bind.connect() as conn:
+        version = current_version(conn) if inspect(conn).has_table(schema_version.name) else 0
+    if version >= LATEST_VERSION:
+        return version
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}; "
+            "run 'python -m app.migrations'"
+        )
+    return upgrade(bind)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Schema version: {upgrade()}")
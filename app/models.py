@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
 from uuid import uuid4
 
-from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Index, String, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .db import Base
@@ -13,6 +13,10 @@ def _utcnow() -> datetime:
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_id_updated_at", "user_id", "updated_at"),
+        Index("ix_tasks_user_id_change_seq", "user_id", "change_seq"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid4()))
     user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), nullable=False)
@@ -22,10 +26,23 @@ class Task(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, nullable=False)
     deleted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     client_updated_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, nullable=False)
+    change_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
 
 
 class TimeEntry(Base):
     __tablename__ = "time_entries"
+    __table_args__ = (
+        Index("ix_time_entries_user_id_updated_at", "user_id", "updated_at"),
+        Index("ix_time_entries_user_id_change_seq", "user_id", "change_seq"),
+        Index("ix_time_entries_task_id", "task_id"),
+        Index("ix_time_entries_user_id_started_at", "user_id", "started_at", "stopped_at"),
+        Index(
+            "ix_time_entries_running",
+            "user_id",
+            postgresql_where=text("stopped_at IS NULL AND deleted_at IS NULL"),
+            sqlite_where=text("stopped_at IS NULL AND deleted_at IS NULL"),
+        ),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid4()))
     user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), nullable=False)
@@ -37,6 +54,7 @@ class TimeEntry(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, nullable=False)
     deleted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     client_updated_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, nullable=False)
+    change_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
 
 
 class User(Base):
@@ -46,3 +64,22 @@ class User(Base):
     email: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(String, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, nullable=False)
+    change_seq: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+    max_entry_seconds: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+
+
+class TaskDayTotal(Base):
+    __tablename__ = "task_day_totals"
+
+    user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    task_id: Mapped[str] = mapped_column(String, ForeignKey("tasks.id"), primary_key=True)
+    seconds: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+class SyncBatch(Base):
+    __tablename__ = "sync_batches"
+
+    user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), primary_key=True)
+    batch_id: Mapped[str] = mapped_column(String, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, nullable=False)
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from .metrics import PASSWORD_HASH_SECONDS, PASSWORD_QUEUE_SECONDS, PASSWORD_REJECTED
+
+
+@lru_cache(maxsize=1)
+def pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["pbkdf2_sha256", "bcrypt"],
+        deprecated="auto",
+    )
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _hash(password: str, submitted_at: float) -> tuple[str, float, float]:
+    queued = time.time() - submitted_at
+    started = time.perf_counter()
+    return pwd_context().hash(password), queued, time.perf_counter() - started
+
+
+def _verify(password: str, password_hash: str, submitted_at: float) -> tuple[bool, float, float]:
+    queued = time.time() - submitted_at
+    started = time.perf_counter()
+    return pwd_context().verify(password, password_hash), queued, time.perf_counter() - started
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self._pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps the workers free of the parent's threads, sockets and
+            # DB connections; they only import this module.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        # Several requests may see the same broken pool; only the first one
+        # replaces it.
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_in_pool(self, func, *args):
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args, time.time())
+        except BrokenProcessPool:
+            # A worker died (OOM killer, SIGKILL) and took the pool with it.
+            # Start a fresh pool and retry once.
+            self._discard_executor(executor)
+            return await loop.run_in_executor(self._get_executor(), func, *args, time.time())
+
+    async def _submit(self, operation: str, func, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            PASSWORD_REJECTED.labels(operation).inc()
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            if self.workers > 0:
+                result, queued, seconds = await self._run_in_pool(func, *args)
+            else:
+                result, queued, seconds = await asyncio.to_thread(func, *args, time.time())
+        finally:
+            self._pending -= 1
+        self.completed += 1
+        self.queue_seconds_total += queued
+        self.queue_seconds_max = max(self.queue_seconds_max, queued)
+        # Recorded here rather than in the worker, so only server processes
+        # write metric samples.
+        PASSWORD_QUEUE_SECONDS.labels(operation).observe(queued)
+        PASSWORD_HASH_SECONDS.labels(operation).observe(seconds)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._submit("verify", _verify, password, password_hash)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_seconds_total": round(self.queue_seconds_total, 6),
+            "queue_seconds_max": round(self.queue_seconds_max, 6),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+password_hasher = PasswordHasher(
+    workers=_workers,
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(_workers, 1) * 8))),
+)
@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import hmac
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from fastapi import Header, HTTPException
+from fastapi.routing import APIRoute
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = 60
+PROFILE_DEFAULT_INTERVAL_MS = 10
+
+_SITE_MARKERS = ("site-packages/", "dist-packages/")
+_CWD = os.getcwd()
+# One profile at a time per worker: overlapping samplers would double the
+# overhead and count each other.
+_profile_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8192)
+def _code_label(code) -> str:
+    filename = code.co_filename
+    for marker in _SITE_MARKERS:
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = os.path.relpath(filename, _CWD) if filename.startswith(_CWD) else os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_code_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples Python stacks of this process from a background thread.
+
+    thread_ids limits sampling to those threads; it may grow while running.
+    The result is in the collapsed format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float, thread_ids: set[int] | None = None) -> None:
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            self.stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_request_sampler: ContextVar[StackSampler | None] = ContextVar("request_sampler", default=None)
+
+
+@contextmanager
+def profiled_thread():
+    # Lets a request-level profile follow work that leaves the event loop
+    # thread, for as long as that work runs; idle pool threads stay out.
+    sampler = _request_sampler.get()
+    if sampler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler.thread_ids.add(thread_id)
+    try:
+        yield
+    finally:
+        sampler.thread_ids.discard(thread_id)
+
+
+def _profiled(endpoint):
+    @functools.wraps(endpoint)
+    def run(*args, **kwargs):
+        with profiled_thread():
+            return endpoint(*args, **kwargs)
+
+    run.profiled = True
+    return run
+
+
+class ProfiledRoute(APIRoute):
+    """Route class whose sync endpoints show up in ?profile=1 profiles.
+
+    FastAPI runs sync endpoints in its threadpool; the wrapper registers the
+    worker thread for the duration of the call. Async endpoints already run
+    on the profiled event loop thread.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs) -> None:
+        # include_router rebuilds routes from their already wrapped endpoints.
+        if not inspect.iscoroutinefunction(endpoint) and not getattr(endpoint, "profiled", False):
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _authorized(token: str | None) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    if not _authorized(x_admin_token):
+        raise HTTPException(status_code=403)
+
+
+async def profile_worker(seconds: float, interval_ms: float) -> PlainTextResponse:
+    if not _profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        sampler = StackSampler(interval_ms / 1000)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+    finally:
+        _profile_lock.release()
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+
+class RequestProfilerMiddleware:
+    """Profile one request end to end when it carries ?profile=1 and X-Admin-Token.
+
+    The request runs normally, side effects included. The response body is
+    replaced by the collapsed stacks, and the original status is kept in
+    X-Profiled-Status.
+    """
+
+    def __init__(self, app: ASGIApp, interval_ms: float = 1) -> None:
+        self.app = app
+        self.interval = interval_ms / 1000
+
+    def _wants_profile(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or not ADMIN_TOKEN or b"profile=" not in scope["query_string"]:
+            return False
+        if parse_qs(scope["query_string"].decode("latin-1")).get("profile") != ["1"]:
+            return False
+        token = dict(scope["headers"]).get(b"x-admin-token")
+        return _authorized(token.decode("latin-1") if token is not None else None)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profile_lock.acquire(blocking=False):
+            busy = JSONResponse({"detail": "A profile is already running"}, status_code=409)
+            await busy(scope, receive, send)
+            return
+
+        status = 500
+
+        async def discard_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        sampler = StackSampler(self.interval, {threading.get_ident()})
+        token = _request_sampler.set(sampler)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, discard_send)
+        finally:
+            sampler.stop()
+            _request_sampler.reset(token)
+            _profile_lock.release()
+
+        response = PlainTextResponse(
+            sampler.collapsed(),
+            headers={
+                "X-Profiled-Status": str(status),
+                "X-Profile-Samples": str(sampler.samples),
+                "X-Profile-Duration-Ms": f"{(time.perf_counter() - started) * 1000:.2f}",
+            },
+        )
+        await response(scope, receive, send)
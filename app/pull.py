@@ -0,0 +1,154 @@
+import base64
+import binascii
+from collections.abc import Iterator
+from datetime import datetime
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .models import Task, TimeEntry, User
+from .schemas import TaskPayload, TimeEntryPayload
+
+
+CURSOR_VERSION = "v1"
+STREAM_BATCH_SIZE = 500
+
+TASK_FIELDS = tuple(TaskPayload.model_fields)
+TIME_ENTRY_FIELDS = tuple(TimeEntryPayload.model_fields)
+
+_STREAM_SOURCES = (
+    ("task", Task, TASK_FIELDS),
+    ("time_entry", TimeEntry, TIME_ENTRY_FIELDS),
+)
+
+
+def encode_cursor(seq: int) -> str:
+    raw = f"{CURSOR_VERSION}:{seq}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        version, seq = base64.urlsafe_b64decode(padded).decode().split(":")
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Malformed cursor") from exc
+    if version != CURSOR_VERSION or not seq.isdigit():
+        raise ValueError("Malformed cursor")
+    return int(seq)
+
+
+def parse_cursor(cursor: str | None) -> int | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def _payload_select(model, fields: tuple[str, ...]):
+    # Payload columns first, change_seq last: zip(fields, row) drops the
+    # trailing sequence number when rendering.
+    columns = [model.__table__.c[name] for name in fields]
+    return select(*columns, model.__table__.c.change_seq)
+
+
+def _filtered(query, model, user_id: str, after_seq: int | None, last_sync_at: datetime | None, high_water: int):
+    query = query.where(model.user_id == user_id, model.change_seq <= high_water)
+    if after_seq is not None:
+        query = query.where(model.change_seq > after_seq)
+    elif last_sync_at is not None:
+        query = query.where(model.updated_at >= last_sync_at)
+    return query.order_by(model.change_seq)
+
+
+def _high_water(db: Session, user_id: str) -> int:
+    users = User.__table__
+    return db.execute(select(users.c.change_seq).where(users.c.id == user_id)).scalar_one()
+
+
+def pull_changes(
+    db: Session,
+    user_id: str,
+    after_seq: int | None,
+    last_sync_at: datetime | None,
+    limit: int | None = None,
+) -> tuple[list[Row], list[Row], int, bool]:
+    # Rows are stamped under the user row lock, so everything at or below the
+    # counter is already committed; capping both queries at it keeps them
+    # consistent even if another sync commits in between.
+    high_water = _high_water(db, user_id)
+
+    task_query = _filtered(_payload_select(Task, TASK_FIELDS), Task, user_id, after_seq, last_sync_at, high_water)
+    entry_query = _filtered(
+        _payload_select(TimeEntry, TIME_ENTRY_FIELDS), TimeEntry, user_id, after_seq, last_sync_at, high_water
+    )
+    if limit is None:
+        tasks = db.execute(task_query).all()
+        entries = db.execute(entry_query).all()
+        return tasks, entries, max(high_water, after_seq or 0), False
+
+    # Keyset page: take limit + 1 from each table, merge on change_seq (unique
+    # per user across both tables) and cut at the limit.
+    tasks = db.execute(task_query.limit(limit + 1)).all()
+    entries = db.execute(entry_query.limit(limit + 1)).all()
+    if len(tasks) + len(entries) <= limit:
+        return tasks, entries, max(high_water, after_seq or 0), False
+
+    page = sorted([*tasks, *entries], key=lambda row: row.change_seq)[:limit]
+    last_seq = page[-1].change_seq
+    tasks = [task for task in tasks if task.change_seq <= last_seq]
+    entries = [entry for entry in entries if entry.change_seq <= last_seq]
+    return tasks, entries, last_seq, True
+
+
+def render_sync_response(tasks: list[Row], entries: list[Row], next_seq: int, has_more: bool) -> bytes:
+    return orjson.dumps(
+        {
+            "server_time": datetime.utcnow(),
+            "cursor": encode_cursor(next_seq),
+            "has_more": has_more,
+            "tasks": [dict(zip(TASK_FIELDS, row)) for row in tasks],
+            "time_entries": [dict(zip(TIME_ENTRY_FIELDS, row)) for row in entries],
+        }
+    )
+
+
+def _ndjson_line(record: dict) -> bytes:
+    return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _stream_batch(user_id: str, model, fields: tuple[str, ...], after_seq: int | None, high_water: int) -> list[Row]:
+    with SessionLocal() as db:
+        query = _filtered(_payload_select(model, fields), model, user_id, after_seq, None, high_water)
+        return db.execute(query.limit(STREAM_BATCH_SIZE)).all()
+
+
+def stream_changes(user_id: str, after_seq: int | None) -> Iterator[bytes]:
+    # Each batch is its own short keyset query in its own session, so a slow
+    # client holds no connection, transaction or SQLite read lock between
+    # chunks. Rows updated meanwhile move above high_water and come with the
+    # next /sync instead.
+    with SessionLocal() as db:
+        high_water = _high_water(db, user_id)
+    for kind, model, fields in _STREAM_SOURCES:
+        last_seq = after_seq
+        while True:
+            rows = _stream_batch(user_id, model, fields, last_seq, high_water)
+            if not rows:
+                break
+            yield b"".join(_ndjson_line({"type": kind, "data": dict(zip(fields, row))}) for row in rows)
+            if len(rows) < STREAM_BATCH_SIZE:
+                break
+            last_seq = rows[-1].change_seq
+    yield _ndjson_line(
+        {
+            "type": "end",
+            "cursor": encode_cursor(max(high_water, after_seq or 0)),
+            "server_time": datetime.utcnow(),
+        }
+    )
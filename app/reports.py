@@ -0,0 +1,123 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import Float, case, cast, extract, func, or_, select
+from sqlalchemy.orm import Session
+
+from .models import TimeEntry
+from .timestamps import to_naive_utc
+
+
+GROUPINGS = ("task", "day", "week", "month")
+
+# julianday() of 1970-01-01 00:00 UTC.
+_JULIAN_EPOCH = 2440587.5
+
+
+def _bucket_starts(start: datetime, stop: datetime, group_by: str, tz: ZoneInfo) -> list[datetime]:
+    local = start.astimezone(tz)
+    day = local.date()
+    if group_by == "week":
+        day -= timedelta(days=day.weekday())
+    elif group_by == "month":
+        day = day.replace(day=1)
+
+    starts = []
+    while True:
+        bucket_start = datetime(day.year, day.month, day.day, tzinfo=tz)
+        if bucket_start >= stop and starts:
+            starts.append(bucket_start)
+            return starts
+        starts.append(bucket_start)
+        if group_by == "day":
+            day += timedelta(days=1)
+        elif group_by == "week":
+            day += timedelta(days=7)
+        else:
+            day = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _epoch_seconds(column, dialect: str):
+    # Stored timestamps are naive UTC; the database turns them into float
+    # seconds so no datetime object is built per row.
+    if dialect == "sqlite":
+        return (func.julianday(column) - _JULIAN_EPOCH) * 86400.0
+    return cast(extract("epoch", column), Float)
+
+
+def _load_intervals(db: Session, user_id: str, start: datetime, stop: datetime, now: datetime):
+    dialect = db.get_bind().dialect.name
+    conditions = (
+        TimeEntry.user_id == user_id,
+        TimeEntry.deleted_at.is_(None),
+        TimeEntry.started_at < to_naive_utc(stop),
+        or_(TimeEntry.stopped_at.is_(None), TimeEntry.stopped_at > to_naive_utc(start)),
+    )
+    # Tasks come back as dense integer ranks, and each task id only on the
+    # first row of that task, so both are read in one consistent query.
+    rows = db.execute(
+        select(
+            _epoch_seconds(TimeEntry.started_at, dialect),
+            func.coalesce(_epoch_seconds(TimeEntry.stopped_at, dialect), now.timestamp()),
+            func.dense_rank().over(order_by=TimeEntry.task_id) - 1,
+            case((func.row_number().over(partition_by=TimeEntry.task_id) == 1, TimeEntry.task_id)),
+        )
+        .where(*conditions)
+        .order_by(TimeEntry.task_id)
+    ).all()
+    if not rows:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+
+    starts, stops, ranks, first_keys = zip(*rows)
+    task_keys = np.array([key for key in first_keys if key is not None], dtype=object)
+    return (
+        np.array(starts, dtype=np.float64),
+        np.array(stops, dtype=np.float64),
+        np.array(ranks, dtype=np.int64),
+        task_keys,
+    )
+
+
+def _split_into_buckets(starts: np.ndarray, stops: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    first = np.searchsorted(bounds, starts, side="right") - 1
+    last = np.searchsorted(bounds, stops, side="left") - 1
+    pieces = last - first + 1
+
+    owner = np.repeat(np.arange(len(starts)), pieces)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    bucket = first[owner] + offsets
+    piece_start = np.maximum(starts[owner], bounds[bucket])
+    piece_stop = np.minimum(stops[owner], bounds[bucket + 1])
+    return np.bincount(bucket, weights=piece_stop - piece_start, minlength=len(bounds) - 1)
+
+
+def range_report(
+    db: Session,
+    user_id: str,
+    start: datetime,
+    stop: datetime,
+    group_by: str,
+    tz: ZoneInfo,
+    now: datetime | None = None,
+) -> list[tuple[str, datetime | None, float]]:
+    now = now or datetime.now(timezone.utc)
+    starts, stops, task_index, task_keys = _load_intervals(db, user_id, start, stop, now)
+
+    starts = np.maximum(starts, start.timestamp())
+    stops = np.minimum(stops, stop.timestamp())
+    keep = stops > starts
+    starts, stops, task_index = starts[keep], stops[keep], task_index[keep]
+
+    if group_by == "task":
+        totals = np.bincount(task_index, weights=stops - starts, minlength=len(task_keys))
+        return [(str(key), None, float(seconds)) for key, seconds in zip(task_keys, totals) if seconds]
+
+    bucket_starts = _bucket_starts(start, stop, group_by, tz)
+    bounds = np.array([bucket.timestamp() for bucket in bucket_starts], dtype=np.float64)
+    totals = _split_into_buckets(starts, stops, bounds)
+    return [
+        (bucket.date().isoformat(), bucket, float(seconds))
+        for bucket, seconds in zip(bucket_starts, totals)
+    ]
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .models import TaskDayTotal, TimeEntry
+
+
+def entry_contribution(
+    task_id: str,
+    started_at: datetime,
+    stopped_at: datetime | None,
+    deleted_at: datetime | None,
+) -> dict[tuple[str, date], int]:
+    if deleted_at is not None or stopped_at is None or stopped_at <= started_at:
+        return {}
+    contribution = {}
+    day = started_at.date()
+    while True:
+        next_midnight = datetime.combine(day + timedelta(days=1), time.min)
+        piece_start = max(started_at, datetime.combine(day, time.min))
+        piece_stop = min(stopped_at, next_midnight)
+        seconds = int((piece_stop - piece_start).total_seconds())
+        if seconds:
+            contribution[(task_id, day)] = seconds
+        if stopped_at <= next_midnight:
+            return contribution
+        day += timedelta(days=1)
+
+
+def _stored_contribution(entry: TimeEntry) -> dict[tuple[str, date], int]:
+    return entry_contribution(entry.task_id, entry.started_at, entry.stopped_at, entry.deleted_at)
+
+
+def collect_deltas(entry_rows: list[dict], entries: dict[str, TimeEntry]) -> dict[tuple[str, date], int]:
+    deltas: dict[tuple[str, date], int] = defaultdict(int)
+    for row in entry_rows:
+        existing = entries.get(row["id"])
+        if existing is not None:
+            for key, seconds in _stored_contribution(existing).items():
+                deltas[key] -= seconds
+        added = entry_contribution(row["task_id"], row["started_at"], row["stopped_at"], row["deleted_at"])
+        for key, seconds in added.items():
+            deltas[key] += seconds
+    return {key: seconds for key, seconds in deltas.items() if seconds}
+
+
+def read_summary(
+    db: Session,
+    user_id: str,
+    date_from: date,
+    date_to: date,
+    task_id: str | None = None,
+) -> list[TaskDayTotal]:
+    query = select(TaskDayTotal).where(
+        TaskDayTotal.user_id == user_id,
+        TaskDayTotal.day >= date_from,
+        TaskDayTotal.day <= date_to,
+        TaskDayTotal.seconds != 0,
+    )
+    if task_id is not None:
+        query = query.where(TaskDayTotal.task_id == task_id)
+    return db.execute(query.order_by(TaskDayTotal.day, TaskDayTotal.task_id)).scalars().all()
+
+
+def rebuild_task_day_totals(conn: Connection) -> None:
+    entries = TimeEntry.__table__
+    query = select(
+        entries.c.user_id,
+        entries.c.task_id,
+        entries.c.started_at,
+        entries.c.stopped_at,
+        entries.c.deleted_at,
+    ).where(entries.c.stopped_at.is_not(None), entries.c.deleted_at.is_(None))
+    totals: dict[tuple, int] = defaultdict(int)
+    for user_id, task_id, started_at, stopped_at, deleted_at in conn.execute(
+        query.execution_options(yield_per=1000)
+    ):
+        for (task, day), seconds in entry_contribution(task_id, started_at, stopped_at, deleted_at).items():
+            totals[(user_id, day, task)] += seconds
+
+    table = TaskDayTotal.__table__
+    conn.execute(delete(table))
+    rows = [
+        {"user_id": user_id, "day": day, "task_id": task_id, "seconds": seconds}
+        for (user_id, day, task_id), seconds in totals.items()
+    ]
+    for start in range(0, len(rows), 1000):
+        conn.execute(insert(table), rows[start:start + 1000])
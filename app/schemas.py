@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class RegisterRequest(BaseModel):
@@ -53,10 +53,43 @@ class SyncChanges(BaseModel):
 
 class SyncRequest(BaseModel):
     last_sync_at: datetime | None = None
+    cursor: str | None = None
+    limit: int | None = Field(default=None, ge=1, le=5000)
+    batch_id: str | None = Field(default=None, min_length=1, max_length=128)
     changes: SyncChanges
 
 
 class SyncResponse(BaseModel):
     server_time: datetime
+    cursor: str
+    has_more: bool = False
     tasks: list[TaskPayload]
     time_entries: list[TimeEntryPayload]
+
+
+class DayTotal(BaseModel):
+    day: date
+    task_id: str
+    seconds: int
+
+
+class SummaryResponse(BaseModel):
+    date_from: date
+    date_to: date
+    total_seconds: int
+    days: list[DayTotal]
+
+
+class RangeBucket(BaseModel):
+    key: str
+    start: datetime | None = None
+    seconds: float
+
+
+class RangeReportResponse(BaseModel):
+    group_by: Literal["task", "day", "week", "month"]
+    tz: str
+    start: datetime
+    stop: datetime
+    total_seconds: float
+    buckets: list[RangeBucket]
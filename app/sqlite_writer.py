@@ -0,0 +1,79 @@
+import contextvars
+import queue
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import TypeVar
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from .db import SQLITE_TUNED, SessionLocal
+from .profiler import profiled_thread
+
+
+T = TypeVar("T")
+
+
+def _call(func: Callable[..., T], db: Session, args: tuple) -> T:
+    with profiled_thread():
+        return func(db, *args)
+
+
+class SingleWriter:
+    def __init__(self, session_factory: sessionmaker) -> None:
+        self._session_factory = session_factory
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            context, future, func, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            db = self._session_factory()
+            try:
+                future.set_result(context.run(_call, func, db, args))
+            except BaseException as exc:
+                db.rollback()
+                future.set_exception(exc)
+            finally:
+                db.close()
+
+    def submit(self, func: Callable[..., T], *args) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((contextvars.copy_context(), future, func, args))
+        return future
+
+    def run(self, func: Callable[..., T], *args) -> T:
+        return self.submit(func, *args).result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+sqlite_writer = SingleWriter(SessionLocal) if SQLITE_TUNED else None
+
+
+def run_write(db: Session, func: Callable[..., T], *args) -> T:
+    if sqlite_writer is None:
+        return func(db, *args)
+    # The writer checks out its own connection from the same pool; hand the
+    # request's connection back first so a full pool cannot deadlock on it.
+    db.close()
+    return sqlite_writer.run(func, *args)
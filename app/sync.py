@@ -0,0 +1,402 @@
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .auth_cache import CurrentUser
+from .intervals import duration_bound, running_entry_ids
+from .metrics import SYNC_CHANGES, sync_phase
+from .models import SyncBatch, Task, TaskDayTotal, TimeEntry, User
+from .rollups import collect_deltas
+from .schemas import SyncChanges, TaskPayload, TimeEntryPayload
+from .timestamps import from_epoch_us, to_epoch_us, to_naive_utc
+
+
+IN_CLAUSE_CHUNK = 500
+SYNC_BATCH_TTL = timedelta(seconds=int(os.getenv("SYNC_BATCH_TTL", str(24 * 3600))))
+
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+_MAX_BIND_PARAMS = {
+    "postgresql": 32767,
+    "sqlite": 999,
+}
+
+# Columns that differ on every write regardless of content.
+_SERVER_COLUMNS = frozenset({"user_id", "updated_at", "change_seq"})
+
+
+class RunningTimerConflict(Exception):
+    # A batch tried to start a timer while another one is running. Nothing
+    # from the batch is applied, so the client can stop one and retry.
+    def __init__(self, entry_id: str, running_id: str) -> None:
+        super().__init__(entry_id, running_id)
+        self.entry_id = entry_id
+        self.running_id = running_id
+
+
+class SyncStats:
+    def __init__(self) -> None:
+        self.outcomes: Counter[tuple[str, str]] = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, kind: str, outcomes: Counter) -> None:
+        with self._lock:
+            for outcome, count in outcomes.items():
+                if count:
+                    self.outcomes[(kind, outcome)] += count
+                    SYNC_CHANGES.labels(kind, outcome).inc(count)
+
+    def stats(self) -> dict:
+        result: dict[str, dict[str, int]] = {"tasks": {}, "time_entries": {}}
+        with self._lock:
+            for (kind, outcome), count in self.outcomes.items():
+                result[kind][outcome] = count
+        return result
+
+
+sync_stats = SyncStats()
+
+
+def _chunked(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _load_by_ids(db: Session, model, ids) -> dict:
+    loaded = {}
+    for chunk in _chunked(list(ids), IN_CLAUSE_CHUNK):
+        for row in db.execute(select(model).where(model.id.in_(chunk))).scalars():
+            loaded[row.id] = row
+    return loaded
+
+
+def _should_apply(existing: datetime | None, incoming_us: int) -> bool:
+    if existing is None:
+        return True
+    return incoming_us >= to_epoch_us(existing)
+
+
+class ResolvedChange(NamedTuple):
+    data: TaskPayload | TimeEntryPayload
+    client_updated_us: int
+
+
+def _collapse_changes(changes: SyncChanges) -> tuple[list[ResolvedChange], list[ResolvedChange]]:
+    # Keeps the latest change per record, converting each client_updated_at
+    # once; later stages compare the int keys only. Tasks are returned first
+    # because entries may reference tasks created in the same batch.
+    tasks: dict[str, ResolvedChange] = {}
+    entries: dict[str, ResolvedChange] = {}
+    for latest, batch in ((tasks, changes.tasks), (entries, changes.time_entries)):
+        for change in batch:
+            payload = change.data
+            updated = to_epoch_us(payload.client_updated_at)
+            current = latest.get(payload.id)
+            if current is None or updated >= current.client_updated_us:
+                latest[payload.id] = ResolvedChange(payload, updated)
+    return list(tasks.values()), list(entries.values())
+
+
+def _reserve_change_seq(db: Session, user: CurrentUser, count: int) -> int:
+    users = User.__table__
+    db.execute(update(users).where(users.c.id == user.id).values(change_seq=users.c.change_seq + count))
+    return db.execute(select(users.c.change_seq).where(users.c.id == user.id)).scalar_one() - count
+
+
+def _batch_seen(db: Session, user: CurrentUser, batch_id: str, now: datetime) -> bool:
+    batches = SyncBatch.__table__
+    query = select(batches.c.batch_id).where(
+        batches.c.user_id == user.id,
+        batches.c.batch_id == batch_id,
+        batches.c.created_at > now - SYNC_BATCH_TTL,
+    )
+    return db.execute(query).first() is not None
+
+
+def _record_batch(db: Session, user: CurrentUser, batch_id: str, now: datetime) -> None:
+    # Expired keys are dropped here, under the user row lock, which also frees
+    # batch_id for reuse once it has aged out.
+    batches = SyncBatch.__table__
+    db.execute(delete(batches).where(batches.c.user_id == user.id, batches.c.created_at <= now - SYNC_BATCH_TTL))
+    db.execute(insert(batches).values(user_id=user.id, batch_id=batch_id, created_at=now))
+
+
+def _task_row(user: CurrentUser, change: ResolvedChange, now: datetime) -> dict:
+    payload = change.data
+    return {
+        "id": payload.id,
+        "user_id": user.id,
+        "title": payload.title,
+        "description": payload.description,
+        "created_at": to_naive_utc(payload.created_at),
+        "updated_at": now,
+        "deleted_at": to_naive_utc(payload.deleted_at),
+        "client_updated_at": from_epoch_us(change.client_updated_us),
+    }
+
+
+def _time_entry_row(user: CurrentUser, change: ResolvedChange, now: datetime) -> dict:
+    payload = change.data
+    return {
+        "id": payload.id,
+        "user_id": user.id,
+        "task_id": payload.task_id,
+        "started_at": to_naive_utc(payload.started_at),
+        "stopped_at": to_naive_utc(payload.stopped_at),
+        "comment": payload.comment,
+        "created_at": to_naive_utc(payload.created_at),
+        "updated_at": now,
+        "deleted_at": to_naive_utc(payload.deleted_at),
+        "client_updated_at": from_epoch_us(change.client_updated_us),
+    }
+
+
+def _resolve_tasks(
+    user: CurrentUser,
+    changes: list[ResolvedChange],
+    tasks: dict[str, Task],
+    now: datetime,
+    outcomes: Counter,
+) -> tuple[list[dict], set[str]]:
+    rows = []
+    owned = {task.id for task in tasks.values() if task.user_id == user.id}
+    for change in changes:
+        payload = change.data
+        task = tasks.get(payload.id)
+        if task is not None:
+            if task.user_id != user.id:
+                outcomes["foreign"] += 1
+                continue
+            if not _should_apply(task.client_updated_at, change.client_updated_us):
+                outcomes["stale"] += 1
+                continue
+        rows.append(_task_row(user, change, now))
+        owned.add(payload.id)
+    return rows, owned
+
+
+def _resolve_time_entries(
+    user: CurrentUser,
+    changes: list[ResolvedChange],
+    owned_task_ids: set[str],
+    entries: dict[str, TimeEntry],
+    now: datetime,
+    outcomes: Counter,
+) -> list[dict]:
+    rows = []
+    for change in changes:
+        payload = change.data
+        entry = entries.get(payload.id)
+        if entry is None:
+            if payload.task_id not in owned_task_ids:
+                outcomes["unknown_task"] += 1
+                continue
+        elif entry.user_id != user.id:
+            outcomes["foreign"] += 1
+            continue
+        elif not _should_apply(entry.client_updated_at, change.client_updated_us):
+            outcomes["stale"] += 1
+            continue
+        rows.append(_time_entry_row(user, change, now))
+    return rows
+
+
+def _drop_unchanged(rows: list[dict], existing: dict) -> tuple[list[dict], int]:
+    # A re-sent record identical to the stored one (client_updated_at
+    # included) is not written: no UPDATE, no updated_at bump and no new
+    # change_seq, so other devices do not pull it again.
+    changed = []
+    for row in rows:
+        stored = existing.get(row["id"])
+        if stored is not None and all(
+            getattr(stored, name) == value for name, value in row.items() if name not in _SERVER_COLUMNS
+        ):
+            continue
+        changed.append(row)
+    return changed, len(rows) - len(changed)
+
+
+def _is_running(row: dict) -> bool:
+    return row["stopped_at"] is None and row["deleted_at"] is None
+
+
+def _check_running_timers(rows: list[dict], running: set[str]) -> None:
+    # Stops and deletes in the batch are applied first, so a client may stop
+    # one timer and start the next in the same sync. Edits to a timer that is
+    # already running are never rejected.
+    already_running = set(running)
+    for row in rows:
+        if not _is_running(row):
+            running.discard(row["id"])
+    for row in rows:
+        if _is_running(row) and row["id"] not in already_running:
+            if running:
+                raise RunningTimerConflict(row["id"], min(running))
+            running.add(row["id"])
+
+
+def _raise_max_entry_seconds(db: Session, user: CurrentUser, rows: list[dict]) -> None:
+    longest = max(
+        (
+            duration_bound(row["started_at"], row["stopped_at"])
+            for row in rows
+            if row["stopped_at"] is not None
+        ),
+        default=0,
+    )
+    users = User.__table__
+    db.execute(
+        update(users)
+        .where(users.c.id == user.id, users.c.max_entry_seconds < longest)
+        .values(max_entry_seconds=longest)
+    )
+
+
+def _upsert_rows(db: Session, model, rows: list[dict], user: CurrentUser) -> None:
+    dialect = db.get_bind().dialect.name
+    insert = _UPSERT_INSERTS[dialect]
+    table = model.__table__
+    columns = list(rows[0])
+    batch_size = max(1, _MAX_BIND_PARAMS[dialect] // len(columns))
+    for batch in _chunked(rows, batch_size):
+        stmt = insert(table).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={name: stmt.excluded[name] for name in columns if name not in ("id", "user_id")},
+            where=(stmt.excluded.client_updated_at >= table.c.client_updated_at)
+            & (table.c.user_id == user.id),
+        )
+        db.execute(stmt)
+
+
+def _write_orm_rows(db: Session, model, rows: list[dict], existing: dict) -> None:
+    for row in rows:
+        obj = existing.get(row["id"])
+        if obj is None:
+            db.add(model(**row))
+            continue
+        for name, value in row.items():
+            if name != "user_id":
+                setattr(obj, name, value)
+
+
+def _write_rows(db: Session, model, rows: list[dict], existing: dict, user: CurrentUser) -> None:
+    if not rows:
+        return
+    if db.get_bind().dialect.name in _UPSERT_INSERTS:
+        _upsert_rows(db, model, rows, user)
+    else:
+        _write_orm_rows(db, model, rows, existing)
+
+
+def _write_rollups(db: Session, user: CurrentUser, deltas: dict) -> None:
+    if not deltas:
+        return
+    rows = [
+        {"user_id": user.id, "day": day, "task_id": task_id, "seconds": seconds}
+        for (task_id, day), seconds in deltas.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect not in _UPSERT_INSERTS:
+        for row in rows:
+            total = db.get(TaskDayTotal, (row["user_id"], row["day"], row["task_id"]))
+            if total is None:
+                db.add(TaskDayTotal(**row))
+            else:
+                total.seconds += row["seconds"]
+        return
+
+    insert = _UPSERT_INSERTS[dialect]
+    table = TaskDayTotal.__table__
+    for batch in _chunked(rows, _MAX_BIND_PARAMS[dialect] // len(rows[0])):
+        stmt = insert(table).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.task_id],
+            set_={"seconds": table.c.seconds + stmt.excluded.seconds},
+        )
+        db.execute(stmt)
+
+
+def _apply_collapsed(
+    db: Session,
+    user: CurrentUser,
+    task_changes: list[ResolvedChange],
+    entry_changes: list[ResolvedChange],
+    batch_id: str | None,
+    task_outcomes: Counter,
+    entry_outcomes: Counter,
+) -> bool:
+    now = datetime.utcnow()
+    with sync_phase("prefetch"):
+        replayed = batch_id is not None and _batch_seen(db, user, batch_id, now)
+        if not replayed:
+            # Bumping the per-user counter first locks the user row, so
+            # concurrent syncs of one account commit in sequence order and
+            # pulls never skip rows.
+            next_seq = _reserve_change_seq(db, user, len(task_changes) + len(entry_changes)) + 1
+            if batch_id is not None:
+                # Re-check under the lock: a concurrent retry of the same
+                # batch may have committed since the first check.
+                replayed = _batch_seen(db, user, batch_id, now)
+                if not replayed:
+                    _record_batch(db, user, batch_id, now)
+        if replayed:
+            task_outcomes["replayed"] += len(task_changes)
+            entry_outcomes["replayed"] += len(entry_changes)
+            return False
+
+        task_ids = {change.data.id for change in task_changes}
+        task_ids.update(change.data.task_id for change in entry_changes)
+        tasks = _load_by_ids(db, Task, task_ids)
+        entries = _load_by_ids(db, TimeEntry, {change.data.id for change in entry_changes})
+
+    with sync_phase("apply_tasks"):
+        task_rows, owned_task_ids = _resolve_tasks(user, task_changes, tasks, now, task_outcomes)
+        task_rows, task_outcomes["noop"] = _drop_unchanged(task_rows, tasks)
+        for seq, row in enumerate(task_rows, start=next_seq):
+            row["change_seq"] = seq
+        _write_rows(db, Task, task_rows, tasks, user)
+        task_outcomes["applied"] += len(task_rows)
+
+    with sync_phase("apply_entries"):
+        entry_rows = _resolve_time_entries(user, entry_changes, owned_task_ids, entries, now, entry_outcomes)
+        entry_rows, entry_outcomes["noop"] = _drop_unchanged(entry_rows, entries)
+        if entry_rows:
+            try:
+                _check_running_timers(entry_rows, running_entry_ids(db, user.id))
+            except RunningTimerConflict:
+                entry_outcomes["overlap"] += 1
+                raise
+        for seq, row in enumerate(entry_rows, start=next_seq + len(task_rows)):
+            row["change_seq"] = seq
+        # Computed before the writers run: the ORM fallback mutates the prefetched entries.
+        deltas = collect_deltas(entry_rows, entries)
+        _write_rows(db, TimeEntry, entry_rows, entries, user)
+        _raise_max_entry_seconds(db, user, entry_rows)
+        _write_rollups(db, user, deltas)
+        entry_outcomes["applied"] += len(entry_rows)
+    return True
+
+
+def apply_changes(db: Session, user: CurrentUser, changes: SyncChanges, batch_id: str | None = None) -> bool:
+    # Returns False when batch_id was already applied and nothing was written.
+    with sync_phase("collapse"):
+        task_changes, entry_changes = _collapse_changes(changes)
+    if not task_changes and not entry_changes:
+        return True
+
+    task_outcomes = Counter(superseded=len(changes.tasks) - len(task_changes))
+    entry_outcomes = Counter(superseded=len(changes.time_entries) - len(entry_changes))
+    try:
+        return _apply_collapsed(db, user, task_changes, entry_changes, batch_id, task_outcomes, entry_outcomes)
+    finally:
+        sync_stats.observe("tasks", task_outcomes)
+        sync_stats.observe("time_entries", entry_outcomes)
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+
+
+# Stored timestamps are naive UTC. Naive input is taken to be UTC already.
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_naive_utc(value: datetime | None) -> datetime | None:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_epoch_us(value: datetime | None) -> int | None:
+    # Integer microseconds since the Unix epoch: the sync ordering key and the
+    # MessagePack datetime encoding.
+    if value is None:
+        return None
+    return (to_naive_utc(value) - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(value: int | None) -> datetime | None:
+    if value is None:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
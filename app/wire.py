@@ -0,0 +1,221 @@
+from datetime import datetime
+from uuid import UUID
+
+import msgpack
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy import Row
+
+from .headers import quality_values
+from .profiler import ProfiledRoute
+from .pull import TASK_FIELDS, TIME_ENTRY_FIELDS, encode_cursor, render_sync_response
+from .schemas import TaskPayload, TimeEntryPayload
+from .timestamps import from_epoch_us, to_epoch_us
+
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack"}
+
+# Compact layout, per record type:
+#   {"fields": ["op", "id", ...], "rows": [[0, <16 bytes>, ...], ...]}
+# Datetimes are integer microseconds since the Unix epoch (UTC), UUIDs are
+# 16 raw bytes and ops are indexes into OPS.
+OPS = ("upsert", "delete")
+_ID_FIELDS = frozenset({"id", "task_id"})
+
+
+def _datetime_fields(model) -> frozenset[str]:
+    return frozenset(
+        name for name, field in model.model_fields.items() if field.annotation in (datetime, datetime | None)
+    )
+
+
+_DATETIME_FIELDS = {
+    "tasks": _datetime_fields(TaskPayload),
+    "time_entries": _datetime_fields(TimeEntryPayload),
+}
+
+
+def is_msgpack(content_type: str | None) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in _MSGPACK_MEDIA_TYPES
+
+
+def accepts_msgpack(accept: str | None) -> bool:
+    # JSON stays the default; MessagePack only when asked for and not ranked
+    # below JSON.
+    accepted = quality_values(accept)
+    msgpack_q = max((accepted.get(media_type, 0.0) for media_type in _MSGPACK_MEDIA_TYPES), default=0.0)
+    json_q = max(accepted.get("application/json", 0.0), accepted.get("*/*", 0.0))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def pack_id(value: str) -> str | bytes:
+    # Only canonical UUIDs are packed, so unpacking restores the exact string.
+    try:
+        parsed = UUID(value)
+    except ValueError:
+        return value
+    return parsed.bytes if str(parsed) == value else value
+
+
+def unpack_id(value: str | bytes) -> str:
+    if isinstance(value, bytes):
+        return str(UUID(bytes=value))
+    return value
+
+
+def _encoders(fields: tuple[str, ...], datetime_fields: frozenset[str]) -> list:
+    encoders = []
+    for name in fields:
+        if name in datetime_fields:
+            encoders.append(to_epoch_us)
+        elif name in _ID_FIELDS:
+            encoders.append(pack_id)
+        else:
+            encoders.append(None)
+    return encoders
+
+
+def _decoder(name: str, datetime_fields: frozenset[str]):
+    if name in datetime_fields:
+        return from_epoch_us
+    if name in _ID_FIELDS:
+        return unpack_id
+    return None
+
+
+def _pack_rows(rows, fields: tuple[str, ...], datetime_fields: frozenset[str]) -> dict:
+    encoders = _encoders(fields, datetime_fields)
+    return {
+        "fields": list(fields),
+        "rows": [
+            [value if encode is None else encode(value) for encode, value in zip(encoders, row)]
+            for row in rows
+        ],
+    }
+
+
+def render_sync_response_msgpack(tasks: list[Row], entries: list[Row], next_seq: int, has_more: bool) -> bytes:
+    # Rows carry a trailing change_seq; zip() against the encoders drops it.
+    return msgpack.packb(
+        {
+            "server_time": to_epoch_us(datetime.utcnow()),
+            "cursor": encode_cursor(next_seq),
+            "has_more": has_more,
+            "tasks": _pack_rows(tasks, TASK_FIELDS, _DATETIME_FIELDS["tasks"]),
+            "time_entries": _pack_rows(entries, TIME_ENTRY_FIELDS, _DATETIME_FIELDS["time_entries"]),
+        },
+        use_bin_type=True,
+    )
+
+
+def sync_response(accept: str | None, tasks: list[Row], entries: list[Row], next_seq: int, has_more: bool) -> Response:
+    if accepts_msgpack(accept):
+        content = render_sync_response_msgpack(tasks, entries, next_seq, has_more)
+        media_type = MSGPACK_MEDIA_TYPE
+    else:
+        content = render_sync_response(tasks, entries, next_seq, has_more)
+        media_type = "application/json"
+    return Response(content, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def _unpack_changes(packed: dict, datetime_fields: frozenset[str]) -> list[dict]:
+    fields = packed["fields"]
+    if "op" not in fields:
+        raise ValueError("missing op column")
+    decoders = [_decoder(name, datetime_fields) for name in fields]
+    changes = []
+    for row in packed["rows"]:
+        data = {
+            name: value if decode is None or value is None else decode(value)
+            for name, decode, value in zip(fields, decoders, row, strict=True)
+        }
+        op = data.pop("op")
+        changes.append({"op": OPS[op] if isinstance(op, int) else op, "data": data})
+    return changes
+
+
+def decode_sync_request(body: bytes) -> dict:
+    # Returns the same shape as the JSON body, so SyncRequest validation and
+    # everything after it is shared by both encodings.
+    try:
+        packed = msgpack.unpackb(body, raw=False)
+        changes = packed.get("changes") or {}
+        return {
+            "last_sync_at": from_epoch_us(packed.get("last_sync_at")),
+            "cursor": packed.get("cursor"),
+            "limit": packed.get("limit"),
+            "batch_id": packed.get("batch_id"),
+            "changes": {
+                kind: _unpack_changes(changes[kind], datetime_fields)
+                for kind, datetime_fields in _DATETIME_FIELDS.items()
+                if changes.get(kind)
+            },
+        }
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError, OverflowError) as exc:
+        raise HTTPException(status_code=400, detail="Malformed MessagePack body") from exc
+
+
+def encode_sync_request(payload: dict) -> bytes:
+    # Client-side counterpart of decode_sync_request, for JSON-shaped payloads
+    # with datetime values.
+    changes = payload.get("changes") or {}
+    packed_changes = {}
+    for kind, datetime_fields in _DATETIME_FIELDS.items():
+        if not changes.get(kind):
+            continue
+        fields = ("op", *changes[kind][0]["data"])
+        encoders = _encoders(fields[1:], datetime_fields)
+        packed_changes[kind] = {
+            "fields": list(fields),
+            "rows": [
+                [
+                    OPS.index(change["op"]),
+                    *(
+                        change["data"][name] if encode is None else encode(change["data"][name])
+                        for name, encode in zip(fields[1:], encoders)
+                    ),
+                ]
+                for change in changes[kind]
+            ],
+        }
+    return msgpack.packb(
+        {
+            "last_sync_at": to_epoch_us(payload.get("last_sync_at")),
+            "cursor": payload.get("cursor"),
+            "limit": payload.get("limit"),
+            "batch_id": payload.get("batch_id"),
+            "changes": packed_changes,
+        },
+        use_bin_type=True,
+    )
+
+
+class _MsgpackRequest(Request):
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = decode_sync_request(await self.body())
+        return self._json
+
+
+class NegotiatedRoute(ProfiledRoute):
+    """Route class that also accepts MessagePack request bodies.
+
+    The body is decoded into the JSON shape and handed to FastAPI as if it were
+    JSON, so validation and the OpenAPI schema stay the same.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            if is_msgpack(request.headers.get("content-type")):
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (key, b"application/json" if key == b"content-type" else value)
+                    for key, value in request.scope["headers"]
+                ]
+                request = _MsgpackRequest(scope, request.receive)
+            return await handler(request)
+
+        return route_handler
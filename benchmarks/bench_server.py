@@ -0,0 +1,40 @@
+"""ASGI entry point used by benchmarks.loadtest: the real app plus RSS stats.
+
+Wraps app.main.app and adds GET /__bench/stats with the server's peak RSS.
+SQL statements per request come from the app's own Server-Timing header.
+The app never imports this.
+
+    uvicorn benchmarks.bench_server:app
+"""
+
+import resource
+import sys
+
+import orjson
+
+from app.main import app as _app
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+async def _send_stats(send) -> None:
+    body = orjson.dumps({"peak_rss_kb": _peak_rss_kb()})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == "/__bench/stats":
+        await _send_stats(send)
+        return
+    await _app(scope, receive, send)
@@ -0,0 +1,77 @@
+"""Measure time from process start to the first successful GET /health.
+
+Each run starts a fresh uvicorn process against a database that has already
+been migrated, so only import and startup cost is measured. Run it on two
+checkouts to compare them:
+
+    python -m benchmarks.cold_start --runs 10
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _time_to_health(env: dict, timeout: float) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError("server did not answer /health in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**os.environ, "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/bench.db"}
+        # Warm-up run creates the schema so later runs only pay for startup.
+        _time_to_health(env, args.timeout)
+        timings = [_time_to_health(env, args.timeout) for _ in range(args.runs)]
+
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "median_ms": round(statistics.median(timings) * 1000, 1),
+                "min_ms": round(min(timings) * 1000, 1),
+                "max_ms": round(max(timings) * 1000, 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
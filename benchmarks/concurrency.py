@@ -0,0 +1,123 @@
+"""Compare the threadpool and async database stacks under many concurrent syncs.
+
+Starts uvicorn once per mode (DB_ASYNC=0 and DB_ASYNC=1) against a fresh
+database, registers one account per simulated client and fires all /sync
+requests at once. Run from the repository root:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.concurrency --clients 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.common import free_port, percentile, wait_ready
+
+
+def _start_server(database_url: str, async_db: bool, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "DB_ASYNC": "1" if async_db else "0",
+        "PASSWORD_HASH_WORKERS": "0",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def _register(client: httpx.AsyncClient) -> str:
+    response = await client.post(
+        "/auth/register",
+        json={"email": f"{uuid4()}@bench.local", "password": "benchmark"},
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def _sync_body(changes: int) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "changes": {
+            "tasks": [
+                {
+                    "op": "upsert",
+                    "data": {
+                        "id": str(uuid4()),
+                        "title": "Benchmark task",
+                        "created_at": now,
+                        "updated_at": now,
+                        "client_updated_at": now,
+                    },
+                }
+                for _ in range(changes)
+            ],
+        },
+    }
+
+
+async def _timed_sync(client: httpx.AsyncClient, token: str, body: dict) -> tuple[float, int]:
+    started = time.perf_counter()
+    response = await client.post("/sync", json=body, headers={"Authorization": f"Bearer {token}"})
+    return time.perf_counter() - started, response.status_code
+
+
+async def _run_mode(database_url: str, async_db: bool, clients: int, changes: int) -> dict:
+    port = free_port()
+    server = _start_server(database_url, async_db, port)
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await wait_ready(client)
+            tokens = [await _register(client) for _ in range(clients)]
+            bodies = [_sync_body(changes) for _ in range(clients)]
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(_timed_sync(client, token, body) for token, body in zip(tokens, bodies))
+            )
+            elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for latency, _ in results]
+    return {
+        "mode": "async" if async_db else "threadpool",
+        "clients": clients,
+        "errors": sum(1 for _, code in results if code != 200),
+        "throughput_rps": round(clients / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--changes", type=int, default=20, help="tasks pushed per sync")
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file per mode")
+    args = parser.parse_args()
+
+    results = []
+    for async_db in (False, True):
+        with tempfile.TemporaryDirectory() as workdir:
+            database_url = args.database_url or f"sqlite:///{workdir}/bench.db"
+            results.append(asyncio.run(_run_mode(database_url, async_db, args.clients, args.changes)))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
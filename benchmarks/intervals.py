@@ -0,0 +1,140 @@
+"""Check and time GET /entries' bounded overlap query against a full scan.
+
+Entries are pushed through apply_changes, so users.max_entry_seconds comes
+from the real write path. The data includes the cases that used to be
+missed: a user whose entries are all under one second, and an entry of
+10.7 s that starts 10.5 s before `from`. Exits with status 1 when the
+indexed query and the full scan disagree. Run from the repository root:
+
+    python -m benchmarks.intervals --entries 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import select  # noqa: E402
+
+from app.auth_cache import CurrentUser  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.intervals import overlapping_entries  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+from app.models import TimeEntry, User  # noqa: E402
+from app.schemas import SyncChanges  # noqa: E402
+from app.sync import apply_changes  # noqa: E402
+
+
+def _entry(task_id: str, started: datetime, stopped: datetime) -> dict:
+    return {
+        "op": "upsert",
+        "data": {
+            "id": str(uuid4()),
+            "task_id": task_id,
+            "started_at": started,
+            "stopped_at": stopped,
+            "created_at": started,
+            "updated_at": started,
+            "client_updated_at": started,
+        },
+    }
+
+
+def _push(db, entries: list[tuple[datetime, datetime]]) -> str:
+    user = User(email=f"{uuid4()}@bench.local", password_hash="x")
+    db.add(user)
+    db.commit()
+    task_id = str(uuid4())
+    now = datetime.utcnow()
+    task = {
+        "op": "upsert",
+        "data": {"id": task_id, "title": "Benchmark", "created_at": now, "updated_at": now, "client_updated_at": now},
+    }
+    changes = SyncChanges.model_validate(
+        {"tasks": [task], "time_entries": [_entry(task_id, started, stopped) for started, stopped in entries]}
+    )
+    apply_changes(db, CurrentUser(user.id), changes)
+    db.commit()
+    return user.id
+
+
+def _full_scan(db, user_id: str, start: datetime, stop: datetime) -> set[str]:
+    rows = db.execute(
+        select(TimeEntry.id, TimeEntry.started_at, TimeEntry.stopped_at).where(
+            TimeEntry.user_id == user_id, TimeEntry.deleted_at.is_(None)
+        )
+    ).all()
+    return {
+        entry_id
+        for entry_id, started, stopped in rows
+        if started < stop and (stopped is None or stopped > start)
+    }
+
+
+def _indexed(db, user_id: str, start: datetime, stop: datetime) -> set[str]:
+    return {entry.id for entry in overlapping_entries(db, user_id, start, stop)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=20_000)
+    parser.add_argument("--windows", type=int, default=200)
+    args = parser.parse_args()
+
+    upgrade()
+    rng = random.Random(42)
+    origin = datetime(2024, 1, 1)
+    edge = origin + timedelta(days=1)
+    db = SessionLocal()
+    try:
+        # Every entry is shorter than a second; one straddles `edge`.
+        subsecond = [(edge - timedelta(milliseconds=300), edge + timedelta(milliseconds=400))]
+        # 10.7 s entry that starts 10.5 s before `edge`.
+        fractional = [(edge - timedelta(seconds=10.5), edge + timedelta(seconds=0.2))]
+        for _ in range(args.entries):
+            started = origin + timedelta(seconds=rng.uniform(0, 30 * 24 * 3600))
+            fractional.append((started, started + timedelta(seconds=rng.uniform(0.1, 10.6))))
+        users = {"subsecond": _push(db, subsecond), "fractional": _push(db, fractional)}
+
+        windows = [(edge, edge + timedelta(hours=1))]
+        for _ in range(args.windows):
+            start = origin + timedelta(seconds=rng.uniform(0, 30 * 24 * 3600))
+            windows.append((start, start + timedelta(seconds=rng.uniform(1, 6 * 3600))))
+
+        mismatches = []
+        timings = []
+        for name, user_id in users.items():
+            for start, stop in windows:
+                started = time.perf_counter()
+                found = _indexed(db, user_id, start, stop)
+                timings.append(time.perf_counter() - started)
+                missing = _full_scan(db, user_id, start, stop) - found
+                if missing:
+                    mismatches.append({"user": name, "from": start.isoformat(), "missing": sorted(missing)})
+    finally:
+        db.close()
+
+    print(
+        json.dumps(
+            {
+                "entries": args.entries,
+                "windows": len(windows) * len(users),
+                "query_ms_median": round(statistics.median(timings) * 1000, 3),
+                "mismatches": mismatches,
+            },
+            indent=2,
+        )
+    )
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
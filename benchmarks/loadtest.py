@@ -0,0 +1,381 @@
+"""Load test /sync, /auth/login and /health with many simulated devices.
+
+Seeds a database with synthetic accounts whose sizes follow a Pareto
+distribution (a few heavy users, many light ones), starts the app under
+uvicorn and runs concurrent devices for a fixed duration. Each device has
+one profile:
+
+    push   pushes --push-size new or edited time entries per sync
+    pull   syncs with empty changes from its cursor
+    first  downloads everything from scratch in --page-size pages, repeatedly
+    login  logs in with email and password
+    health polls GET /health
+
+Devices are assigned to accounts with the same skew, so heavy accounts also
+see the most concurrent syncs. The report is JSON: latency percentiles,
+throughput, SQL statements per request and the server's peak RSS. Pass
+--output to save it and --baseline to compare with an earlier run:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.loadtest --devices 200 --duration 60 --output run.json
+    python -m benchmarks.loadtest --devices 200 --duration 60 --baseline run.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.common import free_port, percentile, wait_ready
+
+
+PASSWORD = "benchmark"
+PROFILES = ("push", "pull", "first", "login", "health")
+MAX_ENTRY_MINUTES = 240
+# The app reports SQL statements per request in Server-Timing:
+# db;dur=1.23;desc="4 queries"
+_DB_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in PROFILES:
+            raise argparse.ArgumentTypeError(f"unknown profile {name!r}")
+        mix[name] = float(weight)
+    return mix
+
+
+def _entry(task_id: str, started: datetime, rng: random.Random) -> dict:
+    return {
+        "id": str(uuid4()),
+        "task_id": task_id,
+        "started_at": started,
+        "stopped_at": started + timedelta(minutes=rng.randrange(5, MAX_ENTRY_MINUTES)),
+        "comment": rng.choice((None, "focus", "meeting", "review")),
+        "created_at": started,
+        "updated_at": started,
+        "client_updated_at": started,
+    }
+
+
+def _seed(
+    database_url: str, users: int, entries: int, skew: float, rng: random.Random
+) -> tuple[list[dict], list[float]]:
+    # Imported here so DATABASE_URL is set before app.db builds the engine.
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import insert
+
+    from app.auth import create_access_token
+    from app.db import SessionLocal, engine
+    from app.migrations import upgrade
+    from app.models import Task, TimeEntry, User
+    from app.passwords import pwd_context
+    from app.pull import encode_cursor
+    from app.rollups import rebuild_task_day_totals
+
+    upgrade()
+    password_hash = pwd_context().hash(PASSWORD)
+    weights = [rng.paretovariate(skew) for _ in range(users)]
+    total_weight = sum(weights)
+    now = datetime.utcnow()
+    accounts = []
+    with SessionLocal() as db:
+        for index, weight in enumerate(weights):
+            user_id = str(uuid4())
+            entry_count = max(1, round(entries * weight / total_weight))
+            task_ids = [str(uuid4()) for _ in range(max(1, min(200, entry_count // 20)))]
+            entry_rows = [
+                {
+                    **_entry(rng.choice(task_ids), now - timedelta(seconds=rng.randrange(365 * 86400)), rng),
+                    "user_id": user_id,
+                }
+                for _ in range(entry_count)
+            ]
+            task_rows = [
+                {
+                    "id": task_id,
+                    "user_id": user_id,
+                    "title": f"Task {number}",
+                    "created_at": now,
+                    "updated_at": now,
+                    "client_updated_at": now,
+                }
+                for number, task_id in enumerate(task_ids)
+            ]
+            for seq, row in enumerate(task_rows + entry_rows, start=1):
+                row["change_seq"] = seq
+            change_seq = len(task_rows) + len(entry_rows)
+            db.execute(
+                insert(User),
+                [
+                    {
+                        "id": user_id,
+                        "email": f"user{index}@bench.local",
+                        "password_hash": password_hash,
+                        "change_seq": change_seq,
+                        "max_entry_seconds": MAX_ENTRY_MINUTES * 60,
+                    }
+                ],
+            )
+            db.execute(insert(Task), task_rows)
+            for start in range(0, len(entry_rows), 5000):
+                db.execute(insert(TimeEntry), entry_rows[start:start + 5000])
+            db.commit()
+            accounts.append(
+                {
+                    "email": f"user{index}@bench.local",
+                    "token": create_access_token(user_id),
+                    "cursor": encode_cursor(change_seq),
+                    "task_ids": task_ids,
+                    "entry_ids": [row["id"] for row in entry_rows],
+                }
+            )
+    with engine.begin() as conn:
+        rebuild_task_day_totals(conn)
+    engine.dispose()
+    return accounts, weights
+
+
+def _push_body(account: dict, cursor: str, size: int, rng: random.Random) -> dict:
+    now = datetime.now(timezone.utc)
+    changes = []
+    for _ in range(size):
+        data = _entry(rng.choice(account["task_ids"]), now - timedelta(hours=rng.randrange(1, 2000)), rng)
+        if rng.random() < 0.3:
+            # Edit of an existing entry; the newer client_updated_at wins.
+            data["id"] = rng.choice(account["entry_ids"])
+        data["client_updated_at"] = now
+        changes.append({"op": "upsert", "data": {name: _json_value(value) for name, value in data.items()}})
+    return {"cursor": cursor, "batch_id": str(uuid4()), "changes": {"time_entries": changes}}
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _query_count(response: httpx.Response) -> int:
+    match = _DB_QUERIES.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.samples: dict[str, list[tuple[float, int, int, int]]] = {}
+
+    async def request(self, name: str, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        queries = _query_count(response)
+        self.samples.setdefault(name, []).append((elapsed, response.status_code, queries, len(response.content)))
+        return response
+
+
+async def _run_device(
+    profile: str,
+    account: dict,
+    client: httpx.AsyncClient,
+    recorder: _Recorder,
+    deadline: float,
+    args: argparse.Namespace,
+    rng: random.Random,
+) -> None:
+    headers = {"Authorization": f"Bearer {account['token']}"}
+    cursor = account["cursor"]
+    while time.perf_counter() < deadline:
+        if profile == "health":
+            await recorder.request("health", client, "GET", "/health")
+        elif profile == "login":
+            await recorder.request(
+                "auth/login",
+                client,
+                "POST",
+                "/auth/login",
+                data={"username": account["email"], "password": PASSWORD},
+            )
+        elif profile == "first":
+            page_cursor = None
+            while time.perf_counter() < deadline:
+                response = await recorder.request(
+                    "sync:first",
+                    client,
+                    "POST",
+                    "/sync",
+                    json={"cursor": page_cursor, "limit": args.page_size, "changes": {}},
+                    headers=headers,
+                )
+                if response.status_code != 200:
+                    break
+                page = response.json()
+                if not page["has_more"]:
+                    break
+                page_cursor = page["cursor"]
+        else:
+            if profile == "push":
+                body = _push_body(account, cursor, args.push_size, rng)
+            else:
+                body = {"cursor": cursor, "changes": {}}
+            response = await recorder.request(f"sync:{profile}", client, "POST", "/sync", json=body, headers=headers)
+            if response.status_code == 200:
+                cursor = response.json()["cursor"]
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+
+def _summarize(samples: list[tuple[float, int, int, int]], duration: float) -> dict:
+    latencies = [latency for latency, _, _, _ in samples]
+    queries = [count for _, _, count, _ in samples]
+    return {
+        "count": len(samples),
+        "errors": sum(1 for _, status, _, _ in samples if status >= 400),
+        "throughput_rps": round(len(samples) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_mean": round(statistics.fmean(queries), 2),
+        "queries_max": max(queries),
+        "response_bytes_mean": round(statistics.fmean(size for _, _, _, size in samples)),
+    }
+
+
+def _revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _run(args: argparse.Namespace, database_url: str) -> dict:
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    accounts, weights = _seed(database_url, args.users, args.entries, args.skew, rng)
+    seed_seconds = time.perf_counter() - seed_started
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "SECRET_KEY": os.environ["SECRET_KEY"],
+        "AUTO_MIGRATE": "0",
+        "SQL_INSTRUMENTATION": "1",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.bench_server:app",
+            "--port", str(port), "--log-level", "warning",
+        ],
+        env=env,
+    )
+    recorder = _Recorder()
+    limits = httpx.Limits(max_connections=args.devices, max_keepalive_connections=args.devices)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+            await wait_ready(client)
+            names = list(args.mix)
+            profiles = rng.choices(names, weights=[args.mix[name] for name in names], k=args.devices)
+            owners = rng.choices(accounts, weights=weights, k=args.devices)
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(
+                *(
+                    _run_device(profile, owner, client, recorder, deadline, args, random.Random(rng.random()))
+                    for profile, owner in zip(profiles, owners)
+                )
+            )
+            duration = time.perf_counter() - started
+            server_stats = (await client.get("/__bench/stats")).json()
+    finally:
+        server.terminate()
+        server.wait()
+
+    all_samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        "revision": _revision(),
+        "config": {
+            "users": args.users,
+            "entries": args.entries,
+            "skew": args.skew,
+            "devices": args.devices,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "push_size": args.push_size,
+            "page_size": args.page_size,
+            "think_ms": args.think_ms,
+            "seed": args.seed,
+            "database": database_url.split(":", 1)[0],
+            "db_async": os.getenv("DB_ASYNC") == "1",
+        },
+        "seed_seconds": round(seed_seconds, 1),
+        "total": _summarize(all_samples, duration) if all_samples else {},
+        "operations": {name: _summarize(samples, duration) for name, samples in sorted(recorder.samples.items())},
+        "server": {"peak_rss_mb": round(server_stats["peak_rss_kb"] / 1024, 1)},
+    }
+
+
+def _compare(result: dict, baseline: dict) -> dict:
+    comparison = {}
+    for name, current in result["operations"].items():
+        previous = baseline.get("operations", {}).get(name)
+        if not previous:
+            continue
+        comparison[name] = {
+            key: round(current[key] / previous[key], 3) if previous[key] else None
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_mean")
+        }
+    return comparison
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--entries", type=int, default=200_000, help="time entries across all users")
+    parser.add_argument("--skew", type=float, default=1.2, help="Pareto shape; lower is more skewed")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=_parse_mix("push=30,pull=45,first=10,login=5,health=10"),
+        help="share of devices per profile",
+    )
+    parser.add_argument("--push-size", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="an empty database; defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = args.database_url or f"sqlite:///{workdir}/bench.db"
+        result = asyncio.run(_run(args, database_url))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            result["vs_baseline"] = _compare(result, json.load(baseline_file))
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Compare the NumPy range report with a naive per-row loop over ORM objects.
+
+Run from the repository root:
+
+    python -m benchmarks.reports --entries 100000 --group-by day
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import insert, or_, select  # noqa: E402
+
+from app.db import SessionLocal  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+from app.models import Task, TimeEntry, User  # noqa: E402
+from app.reports import _bucket_starts, range_report  # noqa: E402
+
+
+def _seed(db, entries: int, tasks: int, start: datetime) -> str:
+    user = User(email=f"{uuid4()}@bench.local", password_hash="x")
+    db.add(user)
+    db.flush()
+    task_ids = [str(uuid4()) for _ in range(tasks)]
+    db.add_all(Task(id=task_id, user_id=user.id, title="Benchmark") for task_id in task_ids)
+    db.flush()
+
+    rng = random.Random(42)
+    span = 365 * 24 * 3600
+    rows = []
+    for _ in range(entries):
+        started = start + timedelta(seconds=rng.randrange(span))
+        rows.append(
+            {
+                "id": str(uuid4()),
+                "user_id": user.id,
+                "task_id": rng.choice(task_ids),
+                "started_at": started,
+                "stopped_at": started + timedelta(minutes=rng.randrange(5, 600)),
+                "created_at": started,
+                "updated_at": started,
+                "client_updated_at": started,
+            }
+        )
+    db.execute(insert(TimeEntry), rows)
+    db.commit()
+    return user.id
+
+
+def _naive_report(db, user_id: str, start: datetime, stop: datetime, group_by: str, tz: ZoneInfo) -> dict:
+    start_naive = start.astimezone(timezone.utc).replace(tzinfo=None)
+    stop_naive = stop.astimezone(timezone.utc).replace(tzinfo=None)
+    entries = db.execute(
+        select(TimeEntry).where(
+            TimeEntry.user_id == user_id,
+            TimeEntry.deleted_at.is_(None),
+            TimeEntry.started_at < stop_naive,
+            or_(TimeEntry.stopped_at.is_(None), TimeEntry.stopped_at > start_naive),
+        )
+    ).scalars().all()
+
+    totals: dict[str, float] = {}
+    bounds = [bucket.astimezone(timezone.utc).replace(tzinfo=None) for bucket in _bucket_starts(start, stop, group_by, tz)]
+    for entry in entries:
+        entry_start = max(entry.started_at, start_naive)
+        entry_stop = min(entry.stopped_at or stop_naive, stop_naive)
+        if entry_stop <= entry_start:
+            continue
+        if group_by == "task":
+            totals[entry.task_id] = totals.get(entry.task_id, 0.0) + (entry_stop - entry_start).total_seconds()
+            continue
+        for bucket_start, bucket_stop in zip(bounds, bounds[1:]):
+            overlap = (min(entry_stop, bucket_stop) - max(entry_start, bucket_start)).total_seconds()
+            if overlap > 0:
+                key = bucket_start.isoformat()
+                totals[key] = totals.get(key, 0.0) + overlap
+    return totals
+
+
+def _median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--group-by", choices=("task", "day", "week", "month"), default="day")
+    parser.add_argument("--tz", default="Europe/Moscow")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    upgrade()
+    tz = ZoneInfo(args.tz)
+    start = datetime(2024, 1, 1, tzinfo=tz)
+    stop = start + timedelta(days=365)
+    db = SessionLocal()
+    try:
+        user_id = _seed(db, args.entries, args.tasks, start.astimezone(timezone.utc).replace(tzinfo=None))
+        vectorised = _median_ms(lambda: range_report(db, user_id, start, stop, args.group_by, tz), args.repeat)
+        naive = _median_ms(
+            lambda: (db.expunge_all(), _naive_report(db, user_id, start, stop, args.group_by, tz)),
+            args.repeat,
+        )
+        print(
+            json.dumps(
+                {
+                    "entries": args.entries,
+                    "group_by": args.group_by,
+                    "numpy_ms": vectorised,
+                    "naive_loop_ms": naive,
+                    "speedup": round(naive / vectorised, 1),
+                },
+                indent=2,
+            )
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Time the /sync change-resolution stage on a large push.
+
+Builds a payload in which some records are sent more than once and
+client_updated_at mixes naive and UTC-aware values. It then compares the old
+collapse with the current one. The old collapse compared raw datetimes per
+type and cannot order naive against aware values, so it gets an aware-only
+copy. It also times the whole apply_changes on SQLite. Run from the
+repository root:
+
+    python -m benchmarks.resolution --changes 50000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.auth_cache import CurrentUser  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+from app.models import User  # noqa: E402
+from app.schemas import SyncChanges  # noqa: E402
+from app.sync import _collapse_changes, apply_changes  # noqa: E402
+from app.timestamps import to_naive_utc  # noqa: E402
+
+
+def _changes(count: int, duplicate_ratio: float, mixed: bool) -> SyncChanges:
+    now = datetime.now(timezone.utc)
+    unique = max(2, int(count * (1 - duplicate_ratio)))
+    task_ids = [str(uuid4()) for _ in range(max(1, unique // 10))]
+    entry_ids = [str(uuid4()) for _ in range(unique - len(task_ids))]
+
+    def stamp(index: int) -> datetime:
+        value = now - timedelta(seconds=index % 97)
+        # Every other value naive, in UTC, as older clients send them.
+        return value.replace(tzinfo=None) if mixed and index % 2 else value
+
+    tasks = []
+    entries = []
+    for index in range(count):
+        record = index % unique
+        if record < len(task_ids):
+            tasks.append(
+                {
+                    "op": "upsert",
+                    "data": {
+                        "id": task_ids[record],
+                        "title": f"Task {record}",
+                        "created_at": now,
+                        "updated_at": now,
+                        "client_updated_at": stamp(index),
+                    },
+                }
+            )
+        else:
+            started = now - timedelta(hours=record)
+            entries.append(
+                {
+                    "op": "upsert",
+                    "data": {
+                        "id": entry_ids[record - len(task_ids)],
+                        "task_id": task_ids[record % len(task_ids)],
+                        "started_at": started,
+                        "stopped_at": started + timedelta(minutes=25),
+                        "comment": "focus",
+                        "created_at": now,
+                        "updated_at": now,
+                        "client_updated_at": stamp(index),
+                    },
+                }
+            )
+    return SyncChanges.model_validate({"tasks": tasks, "time_entries": entries})
+
+
+def _legacy_collapse(changes):
+    latest = {}
+    for change in changes:
+        record_id = change.data.id
+        existing = latest.get(record_id)
+        if not existing or change.data.client_updated_at >= existing.data.client_updated_at:
+            latest[record_id] = change
+    return list(latest.values())
+
+
+def _legacy_resolution(changes: SyncChanges):
+    tasks = _legacy_collapse(changes.tasks)
+    entries = _legacy_collapse(changes.time_entries)
+    # The writer then normalised client_updated_at again for the stale check
+    # and for the stored row.
+    for change in (*tasks, *entries):
+        to_naive_utc(change.data.client_updated_at)
+        to_naive_utc(change.data.client_updated_at)
+    return tasks, entries
+
+
+def _median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 2)
+
+
+def _apply_ms(changes: SyncChanges, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            # A fresh account per run, so every run inserts the same rows.
+            user = User(email=f"{uuid4()}@bench.local", password_hash="x")
+            db.add(user)
+            db.commit()
+            started = time.perf_counter()
+            apply_changes(db, CurrentUser(user.id), changes)
+            db.commit()
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return round(statistics.median(timings) * 1000, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--changes", type=int, default=50_000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="share of changes that repeat a record")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-apply", action="store_true", help="only time the in-memory resolution")
+    args = parser.parse_args()
+
+    mixed = _changes(args.changes, args.duplicates, mixed=True)
+    aware = _changes(args.changes, args.duplicates, mixed=False)
+    tasks, entries = _collapse_changes(mixed)
+
+    results = {
+        "changes": args.changes,
+        "resolved": {"tasks": len(tasks), "time_entries": len(entries)},
+        "resolution_ms": {
+            "legacy_aware_only": _median_ms(lambda: _legacy_resolution(aware), args.repeat),
+            "current_aware_only": _median_ms(lambda: _collapse_changes(aware), args.repeat),
+            "current_mixed": _median_ms(lambda: _collapse_changes(mixed), args.repeat),
+        },
+    }
+    if not args.skip_apply:
+        upgrade()
+        results["apply_changes_ms"] = _apply_ms(mixed, args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
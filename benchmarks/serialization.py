@@ -0,0 +1,147 @@
+"""Compare the old Pydantic /sync rendering with the pre-rendered orjson path.
+
+Run from the repository root:
+
+    python -m benchmarks.serialization --rows 10000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.db import SessionLocal  # noqa: E402
+from app.models import Task, TimeEntry, User  # noqa: E402
+from app.pull import pull_changes, render_sync_response  # noqa: E402
+from app.schemas import SyncResponse, TaskPayload, TimeEntryPayload  # noqa: E402
+
+
+def _seed(db, rows: int) -> str:
+    user = User(email=f"{uuid4()}@bench.local", password_hash="x", change_seq=rows)
+    db.add(user)
+    db.flush()
+    now = datetime.utcnow()
+    task_count = max(1, rows // 5)
+    task_ids = [str(uuid4()) for _ in range(task_count)]
+    db.add_all(
+        Task(
+            id=task_id,
+            user_id=user.id,
+            title=f"Task {index}",
+            description="Benchmark task",
+            created_at=now,
+            updated_at=now,
+            client_updated_at=now,
+            change_seq=index + 1,
+        )
+        for index, task_id in enumerate(task_ids)
+    )
+    db.add_all(
+        TimeEntry(
+            user_id=user.id,
+            task_id=task_ids[index % task_count],
+            started_at=now - timedelta(hours=index),
+            stopped_at=now - timedelta(hours=index) + timedelta(minutes=25),
+            comment="focus",
+            created_at=now,
+            updated_at=now,
+            client_updated_at=now,
+            change_seq=task_count + index + 1,
+        )
+        for index in range(rows - task_count)
+    )
+    db.commit()
+    return user.id
+
+
+def _pydantic_path(db, user_id: str) -> bytes:
+    tasks = db.execute(select(Task).where(Task.user_id == user_id)).scalars().all()
+    entries = db.execute(select(TimeEntry).where(TimeEntry.user_id == user_id)).scalars().all()
+    response = SyncResponse(
+        server_time=datetime.utcnow(),
+        cursor="",
+        tasks=[
+            TaskPayload(
+                id=task.id,
+                title=task.title,
+                description=task.description,
+                created_at=task.created_at,
+                updated_at=task.updated_at,
+                deleted_at=task.deleted_at,
+                client_updated_at=task.client_updated_at,
+            )
+            for task in tasks
+        ],
+        time_entries=[
+            TimeEntryPayload(
+                id=entry.id,
+                task_id=entry.task_id,
+                started_at=entry.started_at,
+                stopped_at=entry.stopped_at,
+                comment=entry.comment,
+                created_at=entry.created_at,
+                updated_at=entry.updated_at,
+                deleted_at=entry.deleted_at,
+                client_updated_at=entry.client_updated_at,
+            )
+            for entry in entries
+        ],
+    )
+    # Mirrors what FastAPI does with response_model: validate, dump, json.dumps.
+    adapter = TypeAdapter(SyncResponse)
+    content = adapter.dump_python(adapter.validate_python(response), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _orjson_path(db, user_id: str) -> bytes:
+    tasks, entries, next_seq, has_more = pull_changes(db, user_id, None, None)
+    return render_sync_response(tasks, entries, next_seq, has_more)
+
+
+def _measure(func, db, user_id: str, repeat: int) -> tuple[float, int]:
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        db.expunge_all()
+        started = time.perf_counter()
+        size = len(func(db, user_id))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.migrations import upgrade
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        user_id = _seed(db, args.rows)
+        results = {}
+        for name, func in (("pydantic", _pydantic_path), ("orjson", _orjson_path)):
+            seconds, size = _measure(func, db, user_id, args.repeat)
+            results[name] = {
+                "median_ms": round(seconds * 1000, 2),
+                "ms_per_10k_rows": round(seconds * 1000 * 10_000 / args.rows, 2),
+                "bytes": size,
+            }
+        results["speedup"] = round(results["pydantic"]["median_ms"] / results["orjson"]["median_ms"], 2)
+        print(json.dumps(results, indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Compare JSON and MessagePack /sync payloads: size and encode/decode time.
+
+Measures the pull response (server encode, client decode) and a push request
+(server decode into SyncRequest). Run from the repository root:
+
+    python -m benchmarks.wire --rows 10000 --changes 2000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import msgpack  # noqa: E402
+import orjson  # noqa: E402
+
+from app.db import SessionLocal  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+from app.pull import pull_changes, render_sync_response  # noqa: E402
+from app.schemas import SyncRequest  # noqa: E402
+from app.wire import decode_sync_request, encode_sync_request, render_sync_response_msgpack  # noqa: E402
+from benchmarks.serialization import _seed  # noqa: E402
+
+
+def _push_payload(changes: int) -> dict:
+    now = datetime.now(timezone.utc)
+    task_ids = [str(uuid4()) for _ in range(max(1, changes // 10))]
+    tasks = [
+        {
+            "op": "upsert",
+            "data": {
+                "id": task_id,
+                "title": f"Task {index}",
+                "description": "Benchmark task",
+                "created_at": now,
+                "updated_at": now,
+                "deleted_at": None,
+                "client_updated_at": now,
+            },
+        }
+        for index, task_id in enumerate(task_ids)
+    ]
+    entries = [
+        {
+            "op": "upsert",
+            "data": {
+                "id": str(uuid4()),
+                "task_id": task_ids[index % len(task_ids)],
+                "started_at": now - timedelta(hours=index),
+                "stopped_at": now - timedelta(hours=index) + timedelta(minutes=25),
+                "comment": "focus",
+                "created_at": now,
+                "updated_at": now,
+                "deleted_at": None,
+                "client_updated_at": now,
+            },
+        }
+        for index in range(changes - len(tasks))
+    ]
+    return {"cursor": None, "changes": {"tasks": tasks, "time_entries": entries}}
+
+
+def _median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 2)
+
+
+def _sizes(body: bytes) -> dict:
+    return {"bytes": len(body), "gzip_bytes": len(gzip.compress(body, compresslevel=6))}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--changes", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        user_id = _seed(db, args.rows)
+        pulled = pull_changes(db, user_id, None, None)
+    finally:
+        db.close()
+
+    json_body = render_sync_response(*pulled)
+    msgpack_body = render_sync_response_msgpack(*pulled)
+    push = _push_payload(args.changes)
+    json_push = orjson.dumps(push)
+    msgpack_push = encode_sync_request(push)
+
+    results = {
+        "pull": {
+            "rows": args.rows,
+            "json": {
+                **_sizes(json_body),
+                "encode_ms": _median_ms(lambda: render_sync_response(*pulled), args.repeat),
+                "decode_ms": _median_ms(lambda: orjson.loads(json_body), args.repeat),
+            },
+            "msgpack": {
+                **_sizes(msgpack_body),
+                "encode_ms": _median_ms(lambda: render_sync_response_msgpack(*pulled), args.repeat),
+                "decode_ms": _median_ms(lambda: msgpack.unpackb(msgpack_body, raw=False), args.repeat),
+            },
+        },
+        "push": {
+            "changes": args.changes,
+            "json": {
+                **_sizes(json_push),
+                "parse_ms": _median_ms(
+                    lambda: SyncRequest.model_validate(orjson.loads(json_push)), args.repeat
+                ),
+            },
+            "msgpack": {
+                **_sizes(msgpack_push),
+                "parse_ms": _median_ms(
+                    lambda: SyncRequest.model_validate(decode_sync_request(msgpack_push)), args.repeat
+                ),
+            },
+        },
+    }
+    for section in results.values():
+        section["size_ratio"] = round(section["json"]["bytes"] / section["msgpack"]["bytes"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()